@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import json
+import os
+import threading
+import time
+
+
+class Catalog(object):
+    def __init__(self, path, ttl=3600):
+        self.path = path
+        self.ttl = ttl
+        self.data = os.path.join(path, 'catalog.jsonl')
+        self.meta = os.path.join(path, 'catalog.json')
+
+        self._lock = threading.Lock()
+        self._loaded = None
+        self._packages = []
+        self._slugs = {}
+
+    def state(self):
+        if not os.path.exists(self.meta):
+            return {}
+
+        try:
+            with open(self.meta, 'r') as stream:
+                return json.load(stream)
+        except (ValueError, OSError):
+            return {}
+
+    @property
+    def available(self):
+        return self.ttl > 0 and os.path.exists(self.data)
+
+    @property
+    def fresh(self):
+        if not self.available: return False
+        return time.time() - self.state().get('fetched', 0) < self.ttl
+
+    def headers(self):
+        if not self.available:
+            return {}
+
+        state = self.state()
+
+        headers = {}
+        if state.get('etag'): headers['If-None-Match'] = state.get('etag')
+        if state.get('modified'): headers['If-Modified-Since'] = state.get('modified')
+        return headers
+
+    def _save(self, state):
+        temporary = '{}.tmp'.format(self.meta)
+        with open(temporary, 'w') as stream:
+            json.dump(state, stream)
+        os.replace(temporary, self.meta)
+
+    def touch(self):
+        state = self.state()
+        state['fetched'] = time.time()
+        self._save(state)
+        return state.get('count', 0)
+
+    def write(self, packages, etag=None, modified=None):
+        os.makedirs(self.path, exist_ok=True)
+
+        # One package per line, a refresh never holds the whole catalog
+        count = 0
+        temporary = '{}.tmp'.format(self.data)
+        try:
+            with open(temporary, 'w') as stream:
+                for package in packages:
+                    stream.write(json.dumps(package))
+                    stream.write('\n')
+                    count += 1
+            os.replace(temporary, self.data)
+        finally:
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+
+        self._save({'etag': etag, 'modified': modified, 'fetched': time.time(), 'count': count})
+        return count
+
+    def _load(self):
+        with self._lock:
+            modified = os.stat(self.data).st_mtime_ns
+            if self._loaded == modified:
+                return self._packages
+
+            packages = []
+            with open(self.data, 'r') as stream:
+                for line in stream:
+                    if not len(line.strip()): continue
+                    packages.append(json.loads(line))
+
+            # The lower case slug is what the package lookup matches
+            self._slugs = {str(package.get('slug', '')).lower(): package for package in packages}
+            self._packages = packages
+            self._loaded = modified
+            return packages
+
+    def search(self, string=None):
+        string = (string or '').lower()
+        for package in self._load():
+            if not len(string):
+                yield package
+                continue
+
+            for field in ['name', 'slug', 'package']:
+                if string not in str(package.get(field) or '').lower(): continue
+                yield package
+                break
+
+    def package(self, string=None):
+        self._load()
+        return self._slugs.get((string or '').lower(), None)
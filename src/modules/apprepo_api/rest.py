@@ -10,114 +10,232 @@
 # Unless required by applicable law or agreed to in writing, software
 # distributed under the License is distributed on an "AS IS" BASIS,
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import concurrent.futures
 import hashlib
 import json
-import math
+import logging
 import os
-import sys
+import threading
+import time
 
 import requests
 
+from modules.apprepo_http.mirrors import MirrorSet
+from modules.apprepo_progress.progress import ServiceProgress
+from .stream import JsonArrayStream
+
 
 class ServiceApprepo(object):
-    def __init__(self, url=None):
-        self.url = url
+    def __init__(self, url=None, session=None, progress=None, mirrors=None, catalog=None, workers=8,
+                 retries=3, chunk_size=1024 * 1024):
+        self.session = session or requests.Session()
+        self.progress = progress or ServiceProgress()
+        self.mirrors = mirrors or MirrorSet(url if isinstance(url, list) else [url])
+        self.catalog = catalog
+        self.workers = workers
+
+        self.retries = retries
+        self.chunk_size = chunk_size
+
+        self._lock = threading.Lock()
+        self._lookups = {}
+
+    @property
+    def url(self):
+        return self.mirrors.best().url
+
+    def _get(self, path, headers=None):
+        return self.mirrors.call(lambda url: self.session.get('{}{}'.format(url, path), headers=headers, stream=True))
+
+    def _items(self, response, chunk_size=64 * 1024):
+        # Items are yielded while the rest of the catalog is still on the way
+        with response:
+            for item in JsonArrayStream(response.iter_content(chunk_size)):
+                yield item
+
+    def refresh(self, force=False):
+        if self.catalog is None:
+            raise Exception('the local catalog is disabled')
 
-    def _progressbar(self, progress=None, filesize=None):
-        if progress is None: return progress
-        if filesize is None: return progress
+        # An unchanged catalog costs one empty answer
+        headers = {} if force else self.catalog.headers()
+        response = self._get('/package?search=', headers)
 
-        done = int(50 * progress / filesize)
+        if response is not None and response.status_code in [304]:
+            response.close()
+            return (False, self.catalog.touch())
 
-        progress_done = '=' * done
-        progress_pending = ' ' * (50 - done)
-        progress_percent = progress / filesize * 100
-        sys.stdout.write("\r[uploading] [{}{}] {:>.1f} %".format(
-            progress_done, progress_pending, progress_percent
-        ))
+        if not response: raise Exception('something went wrong, please try later')
+        if response.status_code not in [200]: raise Exception('something went wrong, please try later')
 
-        if progress_percent == 100:
-            sys.stdout.write('\n')
+        etag = response.headers.get('etag')
+        modified = response.headers.get('last-modified')
+        return (True, self.catalog.write(self._items(response), etag, modified))
 
-        sys.stdout.flush()
-        return progress
+    def _local(self):
+        return self.catalog is not None and self.catalog.fresh
 
     def search(self, string=None):
+        logger = logging.getLogger('apprepo')
+        if self._local():
+            for package in self.catalog.search(string):
+                yield package
+            return
 
         try:
-            response = requests.get('{}/package?search={}'.format(self.url, string))
+            response = self._get('/package?search={}'.format(string))
         except Exception as ex:
+            # An outdated catalog is still better than nothing when offline
+            if self.catalog is None or not self.catalog.available: return
+            logger.warning('repository not reachable, searching the local catalog: {}'.format(ex))
+            for package in self.catalog.search(string):
+                yield package
             return
 
         if not response: raise Exception('something went wrong, please try later')
         if response.status_code not in [200]: raise Exception('something went wrong, please try later')
 
-        for package in json.loads(response.content):
+        for package in self._items(response):
             yield package
 
     def package(self, string=None):
+        logger = logging.getLogger('apprepo')
+        if self._local():
+            package = self.catalog.package(string)
+            # A package newer than the catalog is still asked for remotely
+            if package is not None:
+                yield package
+                return
 
         try:
-            response = requests.get('{}/package/{}/'.format(self.url, string))
+            response = self._get('/package/{}/'.format(string))
         except Exception as ex:
+            if self.catalog is None or not self.catalog.available: return
+            logger.warning('repository not reachable, using the local catalog: {}'.format(ex))
+            package = self.catalog.package(string)
+            if package is None: raise Exception('Can not fetch package data: {}'.format(string))
+            yield package
             return
 
         if not response: raise Exception('Can not fetch package data: {}'.format(string))
         if response.status_code not in [200]: raise Exception('Can not fetch package data: {}'.format(string))
 
-        yield json.loads(response.content)
+        for package in self._items(response):
+            yield package
+
+    def _lookup(self, string):
+        try:
+            for package in self.package(string):
+                return package
+        except Exception as ex:
+            logging.getLogger('apprepo').warning(ex)
+        return None
+
+    def packages(self, names=None):
+        names = list(names or [])
+        unique = list(dict.fromkeys(names))
+        if not len(unique):
+            return []
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(unique)))) as executor:
+            futures, submitted = {}, []
+            with self._lock:
+                # A name somebody is already looking up is waited for, not asked again
+                for name in unique:
+                    if name not in self._lookups:
+                        self._lookups[name] = executor.submit(self._lookup, name)
+                        submitted.append(name)
+                    futures[name] = self._lookups[name]
+
+            # A finished lookup runs the callback right away, it takes the lock itself
+            for name in submitted:
+                futures[name].add_done_callback(lambda future, name=name: self._forget(name, future))
+
+            return [futures[name].result() for name in names]
+
+    def _forget(self, name, future):
+        with self._lock:
+            if self._lookups.get(name) is future:
+                self._lookups.pop(name)
+
+    def _upload_chunk(self, url, unique, authentication, chunk, start, filesize):
+        logger = logging.getLogger('apprepo')
+
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post('{}/package/upload/initialize/'.format(url), headers={
+                    'Content-Range': 'bytes {}-{}/{}'.format(start, start + len(chunk) - 1, filesize),
+                    'Authorization': authentication or None
+                }, files={'file': chunk}, data={'upload_id': unique}, )
+
+                # The answer to an earlier try got lost, the server already has this chunk
+                if attempt and unique is not None and response is not None and response.status_code in [400]:
+                    details = json.loads(response.content)
+                    if details.get('offset', None) == start + len(chunk):
+                        return (unique, attempt)
+
+                # A rejected chunk is final, a busy or broken server is worth another try
+                if response is not None and response.status_code < 500 and response.status_code not in [429]:
+                    if not response: raise Exception(response.content)
+                    if response.status_code not in [200]: raise Exception(response.content)
+
+                    details = json.loads(response.content)
+                    if 'upload_id' not in details.keys(): raise Exception('upload_id not found')
+                    return (details.get('upload_id'), attempt)
+
+                error = Exception(response.content)
+            except requests.RequestException as ex:
+                error = ex
+
+            if attempt >= self.retries: raise error
+
+            logger.warning('chunk at {}: {}, retrying'.format(start, error))
+            time.sleep(0.5 * 2 ** attempt)
+            attempt += 1
 
     def upload(self, path=None, authentication=None, token=None, name=None, description=None):
         assert (path is not None and len(path))
         assert (os.path.exists(path) and not os.path.isdir(path))
 
-        start = 0
         filesize = os.path.getsize(path)
 
-        with open(path, "rb") as stream:
+        # The upload id lives on one server, all chunks go to the same mirror
+        url = self.url
+
+        with open(path, "rb") as stream, self.progress.task('uploading', os.path.basename(path), filesize) as task:
             unique = None
 
-            maximum = 1024 * 1024
-            chunk_count = math.ceil(float(filesize) / maximum)
-            chunk_count_sent = 0
             hash_md5 = hashlib.md5()
             hash_sha1 = hashlib.sha1()
-            while True:
-
-                end = min(filesize, start + maximum)
 
-                stream.seek(start)
-                chunk = stream.read(maximum)
+            def read():
+                chunk = stream.read(self.chunk_size)
                 hash_sha1.update(chunk)
                 hash_md5.update(chunk)
+                return chunk
 
-                try:
-                    response = requests.post('{}/package/upload/initialize/'.format(self.url), headers={
-                        'Content-Range': 'bytes {}-{}/{}'.format(start, end - 1, filesize),
-                        'Authorization': authentication or None
-                    }, files={'file': chunk}, data={'upload_id': unique}, )
-                except Exception as ex:
-                    return
-
-                if not response: raise Exception(response.content)
-                if response.status_code not in [200]: raise Exception(response.content)
-
-                self._progressbar(start + len(chunk), filesize)
-
-                start = end
+            # The server appends chunks at its current offset, they go out strictly in order.
+            # The next chunk is read and hashed while the current one is on the wire
+            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as reader:
+                upcoming = reader.submit(read)
 
-                chunk_count_sent += 1
-                details = json.loads(response.content)
+                start = 0
+                while True:
+                    chunk = upcoming.result()
+                    if start + len(chunk) < filesize:
+                        if not len(chunk): raise Exception('{}: changed while uploading'.format(path))
+                        upcoming = reader.submit(read)
 
-                if 'upload_id' not in details.keys(): raise Exception('upload_id not found')
+                    unique, attempts = self._upload_chunk(url, unique, authentication, chunk, start, filesize)
+                    task.advance(len(chunk))
 
-                unique = details.get('upload_id')
-                if chunk_count > chunk_count_sent:
-                    continue
-                break
+                    start += len(chunk)
+                    if start >= filesize:
+                        break
 
             try:
-                response = requests.post('{}/package/upload/complete/finalize/'.format(self.url), data={
+                response = self.session.post('{}/package/upload/complete/finalize/'.format(url), data={
                     'sha1': hash_sha1.hexdigest(),
                     'md5': hash_md5.hexdigest(),
                     'token': token or None,
@@ -9,14 +9,39 @@
 # Unless required by applicable law or agreed to in writing, software
 # distributed under the License is distributed on an "AS IS" BASIS,
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import os
+
 import hexdi
 
+from modules.apprepo_http.mirrors import MirrorSet
+from .catalog import Catalog
 from .rest import ServiceApprepo
 
 
 @hexdi.permanent('apprepo')
 class ServiceApprepoInstance(ServiceApprepo):
-    @hexdi.inject('config')
-    def __init__(self, config):
-        url = config.get('api.url', 'https://apprepo.de/rest/api')
-        return super(ServiceApprepoInstance, self).__init__(url)
+    @hexdi.inject('config', 'http', 'progress')
+    def __init__(self, config, http, progress):
+        # A comma separated list, the fastest healthy mirror answers
+        urls = config.get('api.url', 'https://apprepo.de/rest/api').split(',')
+        urls = [url.strip() for url in urls if len(url.strip())]
+
+        # A request slower than this percentile of the recent ones is sent to a second mirror
+        percentile = float(config.get('http.hedge', 0.9))
+        cooldown = float(config.get('http.cooldown', 30))
+
+        # Seconds a refreshed catalog answers searches locally, 0 disables it
+        catalog = os.path.expanduser(config.get('catalog.path', '~/.cache/apprepo/catalog'))
+        catalog = Catalog(catalog, int(config.get('catalog.ttl', 3600)))
+
+        # Package lookups running in parallel for a multi-package command
+        workers = int(config.get('api.workers', 8))
+        mirrors = MirrorSet(urls, percentile, cooldown)
+
+        # Tries per upload chunk, the chunks themselves go out one after another
+        retries = int(config.get('upload.retries', 3))
+        chunk_size = int(config.get('upload.chunk_size', 1024 * 1024))
+
+        return super(ServiceApprepoInstance, self).__init__(
+            urls, http, progress, mirrors, catalog, workers, retries, chunk_size
+        )
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import codecs
+import json
+
+WHITESPACE = ' \t\n\r'
+
+
+class JsonArrayStream(object):
+    def __init__(self, chunks, encoding='utf-8'):
+        self.chunks = chunks
+        self.decoder = json.JSONDecoder()
+        self.encoding = encoding
+
+    def _skip(self, buffer, position):
+        while position < len(buffer) and buffer[position] in WHITESPACE:
+            position += 1
+        return position
+
+    def __iter__(self):
+        decoder = codecs.getincrementaldecoder(self.encoding)()
+
+        buffer, position = '', 0
+        state, finished = 'start', False
+        chunks = iter(self.chunks)
+
+        while state != 'done':
+            position = self._skip(buffer, position)
+
+            if position >= len(buffer) and not finished:
+                # Consumed text is dropped, only the current item stays in memory
+                buffer, position = buffer[position:], 0
+                try:
+                    buffer += decoder.decode(next(chunks))
+                except StopIteration:
+                    buffer += decoder.decode(b'', final=True)
+                    finished = True
+                continue
+
+            if state == 'start':
+                if position >= len(buffer):
+                    raise ValueError('empty response')
+
+                # Anything but an array is a single value, it arrives as a whole
+                if buffer[position] != '[':
+                    for chunk in chunks:
+                        buffer += decoder.decode(chunk)
+                    buffer += decoder.decode(b'', final=True)
+                    yield json.loads(buffer[position:])
+                    return
+
+                state, position = 'first', position + 1
+                continue
+
+            if state in ['first', 'separator']:
+                if position >= len(buffer):
+                    raise ValueError('unterminated array')
+
+                if buffer[position] == ']':
+                    state, position = 'done', position + 1
+                    continue
+
+                if state == 'separator':
+                    if buffer[position] != ',':
+                        raise ValueError('expected "," at {}'.format(position))
+                    position += 1
+
+                state = 'item'
+                continue
+
+            try:
+                item, end = self.decoder.raw_decode(buffer, position)
+            except ValueError:
+                if finished: raise
+                end = None
+
+            # A number split between chunks decodes as its prefix, an item
+            # only counts once the separator or the closing bracket follows
+            following = end if end is None else self._skip(buffer, end)
+            if end is None or (not finished and (following >= len(buffer) or buffer[following] not in ',]')):
+                buffer, position = buffer[position:], 0
+                try:
+                    buffer += decoder.decode(next(chunks))
+                except StopIteration:
+                    buffer += decoder.decode(b'', final=True)
+                    finished = True
+                continue
+
+            yield item
+            state, position = 'separator', end
@@ -9,28 +9,52 @@
 # Unless required by applicable law or agreed to in writing, software
 # distributed under the License is distributed on an "AS IS" BASIS,
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
-import configparser
+import fnmatch
 import glob
 import logging
 import os
-import pty
+import re
 import shutil
 import stat
-import subprocess
+import threading
+import time
 from multiprocessing.pool import ThreadPool
 
 from .alias import AppImageAliasFinder
 from .desktop import AppImageDesktopFinder
+from .desktop import DesktopEntry
+from .entry import AppImageEntry
 from .icon import AppImageIconFinder
-from .utils import EqualsSpaceRemover
+from .index import AppImageIndex
+from .inotify import IN_CLOSE_WRITE
+from .inotify import IN_DELETE
+from .inotify import IN_ISDIR
+from .inotify import IN_MOVED_FROM
+from .inotify import IN_MOVED_TO
+from .inotify import Inotify
+from .mount import AppImageMount
+from .squashfs import SquashFsError
+from .squashfs import SquashFsImage
+from .utils import copyfile
+from .utils import copyfileobj
+from .utils import fsync
+from .utils import move
 
 
 class AppImage(object):
-    pool = ThreadPool(processes=1)
 
-    def __init__(self, locations_local=[], locations_global=[]):
+    def __init__(self, locations_local=[], locations_global=[], workers=None, mounts=None, index=None, timeout=10,
+                 storage=None, versions=2):
         self.locations_global = locations_global
         self.locations_local = locations_local
+        self.index = index or AppImageIndex()
+        self.storage = storage
+        self.versions_keep = versions
+
+        workers = workers or os.cpu_count() or 1
+        self.pool = ThreadPool(processes=workers)
+        self.mounts = threading.BoundedSemaphore(mounts or workers)
+        self.timeout = timeout
 
     @property
     def locations(self):
@@ -47,7 +71,7 @@ class AppImage(object):
             return os.path.expanduser('~/Applications/{}'.format(package))
         return '/Applications/{}'.format(package)
 
-    def _check(self, appimage, systemwide=False):
+    def _check(self, appimage, systemwide=False, session=None):
         logger = logging.getLogger('appimagetool')
         if not os.path.exists(appimage) or os.path.isdir(appimage):
             raise Exception('File does not exist')
@@ -55,10 +79,15 @@ class AppImage(object):
         logger.debug('processing: {}'.format(appimage))
         if os.path.exists(appimage) and not os.access(appimage, os.X_OK):
             os.chmod(appimage, self._permissions(systemwide))
-        out_r, out_w = pty.openpty()
-        process = subprocess.Popen([appimage, '--appimage-mount'], stdout=out_w, stderr=subprocess.PIPE)
-        path_mounted = str(os.read(out_r, 2048), 'utf-8', errors='ignore')
-        path_mounted = path_mounted.strip("\n\r")
+
+        if session is not None:
+            return self._check_mountpoint(appimage, session, systemwide)
+
+        with self.session(appimage) as session:
+            return self._check_mountpoint(appimage, session, systemwide)
+
+    def _check_mountpoint(self, appimage, mountpoint, systemwide=False):
+        logger = logging.getLogger('appimagetool')
 
         path_desktop = self.get_path_desktop(systemwide)
         os.makedirs(path_desktop, exist_ok=True)
@@ -69,29 +98,39 @@ class AppImage(object):
         path_alias = self.get_path_alias(systemwide)
         os.makedirs(path_alias, exist_ok=True)
 
-        desktopfinder = AppImageDesktopFinder(appimage, path_mounted)
+        if not mountpoint.exists('AppRun'):
+            return False
+
+        desktopfinder = AppImageDesktopFinder(appimage, mountpoint)
         desktop_origin, desktop_wanted = desktopfinder.files(path_desktop)
-        if not os.path.exists(desktop_origin):
-            process.terminate()
+        if desktop_origin is None:
+            logger.error('.desktop file not found for: {}'.format(appimage))
+            return False
+
+        if not mountpoint.exists(desktop_origin):
             return False
 
-        iconfinder = AppImageIconFinder(appimage, path_mounted)
+        iconfinder = AppImageIconFinder(appimage, mountpoint)
         icon_origin, icon_wanted = iconfinder.files(path_icon)
-        if not os.path.exists(icon_origin):
-            process.terminate()
+        if icon_origin is None:
+            logger.error('icon file not found for: {}'.format(appimage))
+            return False
+
+        if not mountpoint.exists(icon_origin):
             return False
 
-        aliasfinder = AppImageAliasFinder(appimage, path_mounted)
+        aliasfinder = AppImageAliasFinder(appimage, mountpoint)
         alias_origin, alias_wanted = aliasfinder.files(path_alias)
-        if not os.path.exists(alias_origin):
-            process.terminate()
+        if alias_origin is None:
+            logger.error('alias file not found for: {}'.format(appimage))
             return False
 
-        process.terminate()
+        if not os.path.exists(alias_origin):
+            return False
 
         return True
 
-    def _integrate(self, appimage, systemwide=False):
+    def _integrate(self, appimage, systemwide=False, session=None):
         logger = logging.getLogger('appimagetool')
         if not os.path.exists(appimage) or os.path.isdir(appimage):
             raise Exception('File does not exist')
@@ -100,10 +139,23 @@ class AppImage(object):
         if os.path.exists(appimage) and not os.access(appimage, os.X_OK):
             os.chmod(appimage, self._permissions(systemwide))
 
-        out_r, out_w = pty.openpty()
-        process = subprocess.Popen([appimage, '--appimage-mount'], stdout=out_w, stderr=subprocess.PIPE)
-        path_mounted = str(os.read(out_r, 2048), 'utf-8', errors='ignore')
-        path_mounted = path_mounted.strip("\n\r")
+        status = os.stat(appimage)
+        if session is not None:
+            desktop, icon, alias = self._integrate_mountpoint(appimage, session, systemwide)
+        else:
+            with self.session(appimage) as session:
+                desktop, icon, alias = self._integrate_mountpoint(appimage, session, systemwide)
+
+        if desktop is not None and icon is not None and alias is not None:
+            self.index.record(appimage, status, desktop, icon, alias, systemwide)
+
+        return (desktop, icon, alias)
+
+    def _integrate_mountpoint(self, appimage, mountpoint, systemwide=False):
+        logger = logging.getLogger('appimagetool')
+        if not self._check_mountpoint(appimage, mountpoint, systemwide):
+            logger.error('not a valid AppImage: {}'.format(appimage))
+            return (None, None, None)
 
         path_desktop = self.get_path_desktop(systemwide)
         os.makedirs(path_desktop, exist_ok=True)
@@ -114,50 +166,49 @@ class AppImage(object):
         path_alias = self.get_path_alias(systemwide)
         os.makedirs(path_alias, exist_ok=True)
 
-        desktopfinder = AppImageDesktopFinder(appimage, path_mounted)
+        desktopfinder = AppImageDesktopFinder(appimage, mountpoint)
         desktop_origin, desktop_wanted = desktopfinder.files(path_desktop)
         if desktop_origin is None or desktop_wanted is None:
             logger.error('.desktop file not found for: {}'.format(appimage))
             return (None, None, None)
 
-        iconfinder = AppImageIconFinder(appimage, path_mounted)
+        iconfinder = AppImageIconFinder(appimage, mountpoint)
         icon_origin, icon_wanted = iconfinder.files(path_icon)
         if icon_origin is None or icon_wanted is None:
             logger.error('icon file not found for: {}'.format(appimage))
             return (None, None, None)
 
-        aliasfinder = AppImageAliasFinder(appimage, path_mounted)
+        aliasfinder = AppImageAliasFinder(appimage, mountpoint)
         alias_origin, alias_wanted = aliasfinder.files(path_alias)
         if alias_origin is None or alias_wanted is None:
             logger.error('alias file not found for: {}'.format(appimage))
             return (None, None, None)
 
         logger.debug('config: {}'.format(desktop_origin))
-        config = configparser.RawConfigParser()
-        config.optionxform = str
-        config.read(desktop_origin)
+        with mountpoint.open(desktop_origin, 'rb') as desktop_origin_stream:
+            desktop = DesktopEntry(str(desktop_origin_stream.read(), 'utf-8', errors='surrogateescape'))
 
-        if not config.has_option('Desktop Entry', 'Version'):
-            config.set('Desktop Entry', 'Version', 1.0)
+        if not desktop.has('Desktop Entry', 'Version'):
+            desktop.set('Desktop Entry', 'Version', '1.0')
 
-        property_icon = config.get('Desktop Entry', 'Icon')
-        config.set('Desktop Entry', 'Icon', iconfinder.property(property_icon))
+        property_icon = desktop.get('Desktop Entry', 'Icon')
+        desktop.set('Desktop Entry', 'Icon', iconfinder.property(property_icon))
 
-        for section in config.sections():
-            if config.has_option(section, 'Exec'):
-                property_exec = config.get(section, 'Exec')
-                config.set(section, 'Exec', desktopfinder.property(property_exec))
+        for group in desktop.groups():
+            if desktop.has(group, 'Exec'):
+                property_exec = desktop.get(group, 'Exec')
+                desktop.set(group, 'Exec', desktopfinder.property(property_exec))
 
-            if config.has_option(section, 'TryExec'):
-                property_exec = config.get(section, 'TryExec')
-                config.set(section, 'TryExec', desktopfinder.property(property_exec))
+            if desktop.has(group, 'TryExec'):
+                property_exec = desktop.get(group, 'TryExec')
+                desktop.set(group, 'TryExec', desktopfinder.property(property_exec))
 
-        with open(desktop_wanted, 'w') as desktop_wanted_stream:
-            config.write(EqualsSpaceRemover(desktop_wanted_stream))
+        with open(desktop_wanted, 'w', encoding='utf-8', errors='surrogateescape') as desktop_wanted_stream:
+            desktop.write(desktop_wanted_stream)
 
-        with open(icon_origin, 'rb') as icon_origin_stream:
+        with mountpoint.open(icon_origin, 'rb') as icon_origin_stream:
             with open(icon_wanted, 'wb') as icon_wanted_stream:
-                icon_wanted_stream.write(icon_origin_stream.read())
+                copyfileobj(icon_origin_stream, icon_wanted_stream)
                 icon_wanted_stream.close()
             icon_origin_stream.close()
 
@@ -166,17 +217,47 @@ class AppImage(object):
                 os.unlink(alias_wanted)
             os.symlink(alias_origin, alias_wanted)
 
-        process.terminate()
-
         return (desktop_wanted, icon_wanted, alias_wanted)
 
-    def _collection(self, location, filter=None, systemwide=False):
-
-        patterns = ['{}/*.AppImage'.format(location)] \
-            if not filter else ['{}/{}'.format(location, x) for x in filter]
-
-        while len(patterns):
-            for appimage in glob.glob(patterns.pop()):
+    def _integrate_many(self, arguments):
+        appimage, systemwide = arguments
+
+        try:
+            return [appimage] + list(self._integrate(appimage, systemwide))
+        except Exception as ex:
+            logger = logging.getLogger('appimagetool')
+            logger.error('{}: {}'.format(appimage, ex))
+            return [appimage, None, None, None]
+
+    def _matcher(self, filter=None):
+        if not filter:
+            return lambda name: name.endswith('.AppImage') and not name.startswith('.')
+
+        names, patterns = set(), []
+        for name in filter:
+            if glob.has_magic(name):
+                patterns.append(fnmatch.translate(name))
+                continue
+            names.add(name)
+
+        if not len(patterns):
+            return lambda name: name in names
+
+        pattern = re.compile('|'.join(patterns))
+        return lambda name: name in names or pattern.match(name) is not None
+
+    def _collection(self, location, matcher, systemwide=False):
+        try:
+            entries = os.scandir(location)
+        except OSError:
+            return None
+
+        with entries:
+            for entry in entries:
+                if not matcher(entry.name) or entry.is_dir():
+                    continue
+
+                appimage = '{}/{}'.format(location, entry.name)
                 desktopfinder = AppImageDesktopFinder(appimage, None)
                 desktop_origin, desktop_wanted = desktopfinder.files(
                     self.get_path_desktop(systemwide)
@@ -192,7 +273,11 @@ class AppImage(object):
                     self.get_path_alias(systemwide)
                 )
 
-                yield (appimage, desktop_wanted, icon_wanted, alias_wanted)
+                record = self.index.get(appimage)
+                if record is not None and record.get('systemwide') == systemwide:
+                    icon_wanted = record.get('icon') or icon_wanted
+
+                yield AppImageEntry(appimage, desktop_wanted, icon_wanted, alias_wanted, entry)
 
     def get_path_prefix(self, systemwide=False):
         return '/usr' if systemwide else \
@@ -213,58 +298,266 @@ class AppImage(object):
             self.get_path_prefix(systemwide)
         )
 
+    def get_path_appimage(self, package, systemwide=False):
+        return self._destination(package, systemwide)
+
+    def get_path_versions(self, package=None, systemwide=False):
+        destination = self._destination(package or '', systemwide)
+        return os.path.join(os.path.dirname(destination), '.versions', package or '')
+
+    def _retain(self, appimage, package, systemwide=False):
+        if not self.versions_keep or not os.path.isfile(appimage):
+            return None
+
+        folder = self.get_path_versions(package, systemwide)
+        os.makedirs(folder, exist_ok=True)
+
+        # A hardlink keeps the replaced file alive for free,
+        # the new version always comes in with a new inode
+        retained = os.path.join(folder, str(time.time_ns()))
+        try:
+            os.link(appimage, retained)
+        except OSError:
+            copyfile(appimage, retained)
+            shutil.copymode(appimage, retained)
+
+        return retained
+
+    def _prune(self, package, systemwide=False):
+        for version in self.versions(package, systemwide)[self.versions_keep:]:
+            os.unlink(version)
+
+    def versions(self, package, systemwide=False):
+        folder = self.get_path_versions(package, systemwide)
+        if not os.path.isdir(folder):
+            return []
+
+        versions = [name for name in os.listdir(folder) if name.isdigit()]
+        versions = sorted(versions, key=int, reverse=True)
+        return [os.path.join(folder, name) for name in versions]
+
+    def versioned(self, systemwide=False):
+        folder = self.get_path_versions(None, systemwide)
+        if not os.path.isdir(folder):
+            return []
+
+        return sorted([name for name in os.listdir(folder) if len(self.versions(name, systemwide))])
+
+    def rollback(self, package, systemwide=False):
+        versions = self.versions(package, systemwide)
+        if not len(versions):
+            raise Exception('{}: no previous version found'.format(package))
+
+        destination = self._destination(package, systemwide)
+        folder = os.path.dirname(destination)
+
+        # The current version stays available to roll forward again
+        self._retain(destination, package, systemwide)
+        os.replace(versions[0], destination)
+        fsync(folder or '.')
+
+        self._prune(package, systemwide)
+
+        return [destination] + self.integrate(destination, systemwide)
+
     def collection(self, filter=None):
+        matcher = self._matcher(filter)
 
         for location in self.locations_global:
             location = os.path.expanduser(location)
             if location is None: continue
 
-            for bunch in self._collection(location, filter, True):
+            for bunch in self._collection(location, matcher, True):
                 yield bunch
 
         for location in self.locations_local:
             location = os.path.expanduser(location)
             if location is None: continue
 
-            for bunch in self._collection(location, filter, False):
+            for bunch in self._collection(location, matcher, False):
                 yield bunch
 
+    def is_systemwide(self, appimage):
+        folder = os.path.dirname(os.path.abspath(appimage))
+        for location in self.locations_global:
+            if folder == os.path.abspath(os.path.expanduser(location)):
+                return True
+        return False
+
     def is_installed(self, package, systemwide=False):
         destination = self._destination(package, systemwide)
         return os.path.exists(destination)
 
-    def install(self, tempfile, package, force=False, systemwide=False):
+    def install(self, tempfile, package, force=False, systemwide=False, hash=None):
         destination = self._destination(package, systemwide)
         if os.path.exists(destination) and not force:
             raise Exception('{} already exists, use --force to override t'
                             'he existing package'.format(destination))
 
-        if os.path.exists(destination):
-            os.remove(destination)
-
         folder = os.path.dirname(destination)
         if len(folder) and not os.path.exists(folder):
-            os.makedirs(folder, exist_ok=False)
+            os.makedirs(folder, exist_ok=True)
 
-        shutil.move(tempfile, destination)
-        permissions = self._permissions(systemwide)
-        os.chmod(destination, permissions)
+        # The new file is complete and executable before it replaces
+        # the old one, running launchers never see a missing AppImage
+        os.chmod(tempfile, self._permissions(systemwide))
 
-        if os.path.exists(tempfile):
+        # A cache hit of the installed version is a link to the installed file,
+        # a rename between two links of one inode would leave the temporary file behind
+        chunks = None
+        if os.path.exists(destination) and os.path.samefile(tempfile, destination):
             os.unlink(tempfile)
+        else:
+            if self.storage is not None:
+                tempfile, chunks = self.storage.rebuild(tempfile, folder)
+            fsync(tempfile)
+
+            self._retain(destination, package, systemwide)
+            move(tempfile, destination)
+            fsync(folder or '.')
+            self._prune(package, systemwide)
+
+        # Known from the download, the update check does not read the file again
+        if hash is not None:
+            self.index.hash(destination, os.stat(destination), hash)
+
+        if chunks is not None:
+            self.storage.record(destination, chunks)
 
         return [destination] + self.integrate(destination, systemwide)
 
-    def check(self, appimage, systemwide=False):
+    def session(self, appimage):
+        logger = logging.getLogger('appimagetool')
+        try:
+            return SquashFsImage(appimage)
+        except (SquashFsError, OSError) as ex:
+            logger.debug('native reader not available, falling back to --appimage-mount: {}'.format(ex))
+            return AppImageMount(appimage, self.timeout, self.mounts)
+
+    def check(self, appimage, systemwide=False, session=None):
         async_result = self.pool.apply_async(self._check, (
-            appimage, systemwide
+            appimage, systemwide, session
         ))
 
         return async_result.get()
 
-    def integrate(self, appimage, systemwide=False):
+    def integrate(self, appimage, systemwide=False, session=None):
         async_result = self.pool.apply_async(self._integrate, (
-            appimage, systemwide
+            appimage, systemwide, session
         ))
 
-        return list(async_result.get())
+        result = list(async_result.get())
+        self.index.save()
+        return result
+
+    def integrate_many(self, appimages, systemwide=False):
+        arguments = [(appimage, systemwide) for appimage in appimages]
+        if not len(arguments):
+            return None
+
+        try:
+            for result in self.pool.imap_unordered(self._integrate_many, arguments):
+                yield result
+        finally:
+            self.index.save()
+
+    def is_integrated(self, appimage, systemwide=False, status=None):
+        try:
+            status = status or os.stat(appimage)
+            return self.index.fresh(appimage, status, systemwide)
+        except OSError:
+            return False
+
+    def hash(self, appimage, status=None, hasher=None):
+        status = status or os.stat(appimage)
+
+        hash = self.index.hash(appimage, status)
+        if hash is not None or hasher is None:
+            return hash
+
+        hash = self.index.hash(appimage, status, hasher(appimage))
+        self.index.save()
+        return hash
+
+    def forget(self, appimage):
+        self.index.discard(appimage)
+        self.index.save()
+
+    def unintegrate(self, appimage, systemwide=False):
+        # The index knows where the image was integrated, the caller only guesses
+        record = self.index.get(appimage)
+        if record is not None and record.get('systemwide') is not None:
+            systemwide = record.get('systemwide')
+
+        desktopfinder = AppImageDesktopFinder(appimage, None)
+        desktop_origin, desktop_wanted = desktopfinder.files(
+            self.get_path_desktop(systemwide)
+        )
+
+        iconfinder = AppImageIconFinder(appimage, None)
+        icon_origin, icon_wanted = iconfinder.files(
+            self.get_path_icon(systemwide)
+        )
+
+        aliasfinder = AppImageAliasFinder(appimage, None)
+        alias_origin, alias_wanted = aliasfinder.files(
+            self.get_path_alias(systemwide)
+        )
+
+        if record is not None and record.get('icon'):
+            icon_wanted = record.get('icon')
+
+        for pattern in (desktop_wanted, icon_wanted, alias_wanted):
+            for path in glob.glob(pattern):
+                os.remove(path)
+
+        self.forget(appimage)
+
+        # The chunks themselves stay until the cleanup finds them unreferenced
+        if self.storage is not None:
+            self.storage.discard(appimage)
+
+        return (desktop_wanted, icon_wanted, alias_wanted)
+
+    def watch(self, delay=0.5):
+        logger = logging.getLogger('appimagetool')
+
+        with Inotify() as inotify:
+            for location in self.locations:
+                location = os.path.expanduser(location)
+                if not os.path.isdir(location):
+                    logger.warning('{} does not exist, not watching it'.format(location))
+                    continue
+
+                inotify.add(location, IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE)
+
+            # Events are collected per file and processed once the file
+            # stayed quiet for the given delay, partial writes are never seen
+            pending = {}
+            while True:
+                timeout = None
+                if len(pending):
+                    timeout = max(0, min(x[0] for x in pending.values()) - time.monotonic())
+
+                for folder, name, mask in inotify.read(timeout):
+                    if mask & IN_ISDIR or not name.endswith('.AppImage'):
+                        continue
+
+                    action = self.integrate \
+                        if mask & (IN_CLOSE_WRITE | IN_MOVED_TO) else \
+                        self.unintegrate
+
+                    appimage = os.path.join(folder, name)
+                    pending[appimage] = (time.monotonic() + delay, action)
+
+                for appimage, (deadline, action) in list(pending.items()):
+                    if deadline > time.monotonic():
+                        continue
+
+                    del pending[appimage]
+                    try:
+                        desktop, icon, alias = action(appimage, self.is_systemwide(appimage))
+                        yield (action.__name__, appimage, desktop, icon, alias)
+                    except Exception as ex:
+                        logger.error('{}: {}'.format(appimage, ex))
+                        yield ('failed', appimage, None, None, None)
@@ -0,0 +1,206 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+FICLONERANGE = 0x4020940d
+CLONE_RANGE = struct.Struct('qQQQ')
+
+BLOCK_SIZE = 4096
+MARKER = b'\xa5\x5a'
+
+
+class ChunkStore(object):
+    def __init__(self, path, minimum=64 * 1024, maximum=1024 * 1024):
+        self.path = path
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def _chunk(self, digest):
+        return os.path.join(self.path, 'chunks', digest[:2], digest)
+
+    def _manifest(self, appimage):
+        name = hashlib.sha1(os.fsencode(os.path.abspath(appimage))).hexdigest()
+        return os.path.join(self.path, 'manifests', '{}.json'.format(name))
+
+    def _key(self, status):
+        return [status.st_dev, status.st_ino, status.st_size, status.st_mtime_ns]
+
+    def _write(self, path, data):
+        folder = os.path.dirname(path)
+        os.makedirs(folder, exist_ok=True)
+
+        with tempfile.NamedTemporaryFile(dir=folder, prefix='.', delete=False) as stream:
+            stream.write(data)
+        os.replace(stream.name, path)
+
+    def _boundaries(self, data):
+        size = len(data)
+
+        start = 0
+        while start < size:
+            # The marker makes the edges depend on the content, so equal
+            # payloads are cut the same way in every file they appear in
+            end = data.find(MARKER, start + self.minimum, start + self.maximum)
+            end = start + self.maximum if end < 0 else end
+
+            # Chunks start on filesystem blocks, otherwise they can not be cloned.
+            # The price is shift resistance: the rounding counts from the start
+            # of the file, so content that moved by anything but whole blocks
+            # is cut differently and shares no chunks with the old version.
+            # Cloning wins here, an update that does not move its payload still
+            # dedups and materializes without copying a single byte
+            end = min(size, (end + BLOCK_SIZE - 1) // BLOCK_SIZE * BLOCK_SIZE)
+            yield (start, end)
+            start = end
+
+    def add(self, path):
+        chunks = []
+        created = 0
+
+        with open(path, 'rb') as stream:
+            if not os.fstat(stream.fileno()).st_size:
+                return (chunks, created)
+
+            with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for start, end in self._boundaries(data):
+                    chunk = data[start:end]
+
+                    digest = hashlib.sha256(chunk).hexdigest()
+                    chunks.append([digest, len(chunk)])
+
+                    if os.path.exists(self._chunk(digest)): continue
+                    self._write(self._chunk(digest), chunk)
+                    created += len(chunk)
+
+        return (chunks, created)
+
+    def _copy(self, source, destination, length, position):
+        copied = 0
+        try:
+            while copied < length:
+                count = os.copy_file_range(source, destination, length - copied, copied, position + copied)
+                if not count: break
+                copied += count
+            return copied
+        except (AttributeError, OSError):
+            pass
+
+        while copied < length:
+            data = os.pread(source, length - copied, copied)
+            if not data: break
+            os.pwrite(destination, data, position + copied)
+            copied += len(data)
+        return copied
+
+    def materialize(self, chunks, destination):
+        cloned = 0
+        position = 0
+
+        descriptor = os.open(destination, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            for digest, length in chunks:
+                source = os.open(self._chunk(digest), os.O_RDONLY)
+                try:
+                    # A zero length clones the whole chunk, the last one ends unaligned
+                    fcntl.ioctl(descriptor, FICLONERANGE, CLONE_RANGE.pack(source, 0, 0, position))
+                    cloned += length
+                except OSError:
+                    if self._copy(source, descriptor, length, position) != length:
+                        raise Exception('{}: chunk is truncated'.format(self._chunk(digest)))
+                finally:
+                    os.close(source)
+                position += length
+
+            os.ftruncate(descriptor, position)
+        finally:
+            os.close(descriptor)
+
+        return cloned
+
+    def rebuild(self, path, folder=None):
+        logger = logging.getLogger('appimagetool')
+        started = time.monotonic()
+
+        chunks, created = self.add(path)
+
+        folder = folder or os.path.dirname(path)
+        with tempfile.NamedTemporaryFile(dir=folder, prefix='.', suffix='.part', delete=False) as stream:
+            destination = stream.name
+
+        try:
+            materialized = time.monotonic()
+            cloned = self.materialize(chunks, destination)
+            os.chmod(destination, os.stat(path).st_mode)
+        except Exception:
+            os.unlink(destination)
+            raise
+
+        os.unlink(path)
+
+        size = sum([length for digest, length in chunks])
+        finished = time.monotonic()
+        logger.info('{}: {} chunks, {} new bytes, {} cloned bytes, stored in {:.0f} ms, '
+                    'materialized in {:.0f} ms ({:.1f} MB/s)'.format(
+            path, len(chunks), created, cloned, (materialized - started) * 1000, (finished - materialized) * 1000,
+            size / 1024 / 1024 / max(finished - materialized, 0.000001)
+        ))
+
+        return (destination, chunks)
+
+    def record(self, appimage, chunks):
+        manifest = {'path': appimage, 'key': self._key(os.stat(appimage)), 'chunks': chunks}
+        self._write(self._manifest(appimage), bytes(json.dumps(manifest), 'utf-8'))
+
+    def discard(self, appimage):
+        if os.path.exists(self._manifest(appimage)):
+            os.unlink(self._manifest(appimage))
+
+    def collect(self):
+        referenced = set()
+
+        folder = os.path.join(self.path, 'manifests')
+        for entry in (os.scandir(folder) if os.path.isdir(folder) else []):
+            if not entry.name.endswith('.json'): continue
+
+            try:
+                with open(entry.path, 'r') as stream:
+                    manifest = json.load(stream)
+                status = os.stat(manifest.get('path'))
+            except (ValueError, OSError, TypeError):
+                status = None
+
+            # The AppImage was removed or replaced without the store
+            if status is None or self._key(status) != manifest.get('key'):
+                os.unlink(entry.path)
+                continue
+
+            for digest, length in manifest.get('chunks', []):
+                referenced.add(digest)
+
+        removed = []
+        folder = os.path.join(self.path, 'chunks')
+        for prefix in (os.scandir(folder) if os.path.isdir(folder) else []):
+            if not prefix.is_dir(): continue
+            for entry in os.scandir(prefix.path):
+                if entry.name in referenced: continue
+                os.unlink(entry.path)
+                removed.append(entry.path)
+
+        return removed
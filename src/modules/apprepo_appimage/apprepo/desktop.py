@@ -9,7 +9,6 @@
 # Unless required by applicable law or agreed to in writing, software
 # distributed under the License is distributed on an "AS IS" BASIS,
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
-import glob
 import pathlib
 
 
@@ -23,8 +22,7 @@ class AppImageDesktopFinder(object):
         if self.mountpoint is None:
             return None
 
-        pattern = '{}/*.desktop'.format(self.mountpoint)
-        for path in glob.glob(pattern):
+        for path in self.mountpoint.glob('*.desktop'):
             return path
 
     @property
@@ -41,3 +39,127 @@ class AppImageDesktopFinder(object):
         return (self.origin, "{}/{}.desktop".format(
             destination, self.wanted
         ))
+
+
+class DesktopEntry(object):
+    def __init__(self, text=''):
+        self._lines = iter(text.splitlines())
+        self._group = None
+        self._preamble = []
+        self._groups = {}
+        self._keys = {}
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8', errors='surrogateescape') as stream:
+            return cls(stream.read())
+
+    def _parse(self, group=None):
+        if self._lines is None:
+            return None
+
+        if group is not None and group in self._groups and self._group != group:
+            return None
+
+        for line in self._lines:
+            stripped = line.strip()
+            if stripped.startswith('[') and stripped.endswith(']'):
+                self._group = stripped[1:-1]
+                self._groups.setdefault(self._group, [])
+                self._keys.setdefault(self._group, {})
+                # The wanted group is complete as soon as the next one starts
+                if group is not None and group in self._groups and self._group != group:
+                    return None
+                continue
+
+            entries = self._preamble \
+                if self._group is None else \
+                self._groups[self._group]
+
+            if not stripped or stripped.startswith('#') or '=' not in stripped or self._group is None:
+                entries.append([None, line])
+                continue
+
+            key, value = line.split('=', 1)
+            key, value = key.strip(), value.strip()
+
+            keys = self._keys[self._group]
+            if key in keys:
+                keys[key][1] = value
+                continue
+
+            keys[key] = [key, value]
+            entries.append(keys[key])
+
+        self._lines = None
+
+    def _locales(self, key, locale=None):
+        if not locale:
+            return [key]
+
+        locale = locale.split('.', 1)[0]
+        language, modifier = locale.split('@', 1) if '@' in locale else (locale, None)
+        language, country = language.split('_', 1) if '_' in language else (language, None)
+
+        candidates = []
+        if country and modifier: candidates.append('{}_{}@{}'.format(language, country, modifier))
+        if country: candidates.append('{}_{}'.format(language, country))
+        if modifier: candidates.append('{}@{}'.format(language, modifier))
+        candidates.append(language)
+
+        return ['{}[{}]'.format(key, x) for x in candidates] + [key]
+
+    def groups(self):
+        self._parse()
+        return list(self._groups.keys())
+
+    def keys(self, group):
+        self._parse()
+        return list(self._keys.get(group, {}).keys())
+
+    def has(self, group, key):
+        self._parse(group)
+        return key in self._keys.get(group, {})
+
+    def get(self, group, key, default=None, locale=None):
+        self._parse(group)
+        keys = self._keys.get(group, {})
+        for candidate in self._locales(key, locale):
+            if candidate in keys:
+                return keys[candidate][1]
+        return default
+
+    def set(self, group, key, value):
+        self._parse()
+        if group not in self._groups:
+            self._groups[group] = []
+            self._keys[group] = {}
+
+        keys = self._keys[group]
+        if key in keys:
+            keys[key][1] = '{}'.format(value)
+            return value
+
+        # Keep the blank lines separating the groups at the end
+        entries = self._groups[group]
+        position = len(entries)
+        while position and entries[position - 1][0] is None and not entries[position - 1][1].strip():
+            position -= 1
+
+        keys[key] = [key, '{}'.format(value)]
+        entries.insert(position, keys[key])
+        return value
+
+    def dumps(self):
+        self._parse()
+
+        lines = [line for key, line in self._preamble]
+        for group, entries in self._groups.items():
+            lines.append('[{}]'.format(group))
+            for key, value in entries:
+                lines.append(value if key is None else '{}={}'.format(key, value))
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, stream):
+        stream.write(self.dumps())
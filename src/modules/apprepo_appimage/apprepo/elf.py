@@ -0,0 +1,133 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import os
+import struct
+
+
+class ElfHeader(object):
+    def __init__(self, header):
+        if len(header) < 52 or header[:4] != b'\x7fELF':
+            raise ValueError('not an ELF file')
+
+        self.endian = '<' if header[5] == 1 else '>'
+        self.is64 = header[4] == 2
+        self.magic = header[8:11]
+
+        if self.is64:
+            self.section_offset, = struct.unpack_from('{}Q'.format(self.endian), header, 0x28)
+            self.section_size, self.section_count, self.section_names = \
+                struct.unpack_from('{}HHH'.format(self.endian), header, 0x3A)
+        else:
+            self.section_offset, = struct.unpack_from('{}I'.format(self.endian), header, 0x20)
+            self.section_size, self.section_count, self.section_names = \
+                struct.unpack_from('{}HHH'.format(self.endian), header, 0x2E)
+
+    @property
+    def payload_offset(self):
+        # The AppImage runtime keeps the section header table at the very
+        # end of the ELF part, the squashfs payload starts right after it
+        return self.section_offset + self.section_size * self.section_count
+
+    def section(self, table, index):
+        position = index * self.section_size
+        if self.is64:
+            name, type, flags, address, offset, size = \
+                struct.unpack_from('{}IIQQQQ'.format(self.endian), table, position)
+        else:
+            name, type, flags, address, offset, size = \
+                struct.unpack_from('{}IIIIII'.format(self.endian), table, position)
+        return (name, offset, size)
+
+
+def payload_offset(stream):
+    stream.seek(0)
+    return ElfHeader(stream.read(64)).payload_offset
+
+
+class AppImageElf(object):
+    def __init__(self, path):
+        self.path = path
+        self._header = None
+        self._sections = None
+
+    def _load(self, descriptor):
+        header = ElfHeader(os.pread(descriptor, 64, 0))
+
+        table = os.pread(descriptor, header.section_size * header.section_count, header.section_offset)
+        if len(table) < header.section_size * header.section_count:
+            raise ValueError('section header table is truncated')
+
+        name, offset, size = header.section(table, header.section_names)
+        names = os.pread(descriptor, size, offset)
+
+        sections = {}
+        for index in range(header.section_count):
+            name, offset, size = header.section(table, index)
+            name = names[name:names.find(b'\0', name)]
+            sections[str(name, 'ascii', errors='ignore')] = (offset, size)
+
+        return (header, sections)
+
+    def _read(self, size=None, offset=None):
+        descriptor = os.open(self.path, os.O_RDONLY)
+        try:
+            if self._header is None:
+                self._header, self._sections = self._load(descriptor)
+            if size is None: return None
+            return os.pread(descriptor, size, offset)
+        finally:
+            os.close(descriptor)
+
+    @property
+    def header(self):
+        if self._header is None:
+            self._read()
+        return self._header
+
+    @property
+    def sections(self):
+        if self._sections is None:
+            self._read()
+        return self._sections
+
+    def section(self, name):
+        if name not in self.sections.keys():
+            return None
+
+        offset, size = self.sections[name]
+        data = self._read(size, offset)
+        data = data.rstrip(b'\0')
+        return data if len(data) else None
+
+    @property
+    def type(self):
+        if self.header.magic[:2] != b'AI':
+            return None
+        return self.header.magic[2]
+
+    @property
+    def payload_offset(self):
+        return self.header.payload_offset
+
+    @property
+    def update_information(self):
+        data = self.section('.upd_info')
+        if data is None: return None
+        return str(data, 'utf-8', errors='ignore').strip()
+
+    @property
+    def signature(self):
+        return self.section('.sha256_sig')
+
+    @property
+    def signature_key(self):
+        return self.section('.sig_key')
@@ -0,0 +1,50 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import os
+
+from .elf import AppImageElf
+
+
+class AppImageEntry(tuple):
+    def __new__(cls, appimage, desktop=None, icon=None, alias=None, direntry=None):
+        entry = super(AppImageEntry, cls).__new__(cls, (appimage, desktop, icon, alias))
+        entry._direntry = direntry
+        return entry
+
+    @property
+    def appimage(self):
+        return self[0]
+
+    @property
+    def desktop(self):
+        return self[1]
+
+    @property
+    def icon(self):
+        return self[2]
+
+    @property
+    def alias(self):
+        return self[3]
+
+    @property
+    def metadata(self):
+        if not hasattr(self, '_metadata'):
+            self._metadata = AppImageElf(self.appimage)
+        return self._metadata
+
+    @property
+    def status(self):
+        # The directory entry caches its stat result
+        if self._direntry is not None:
+            return self._direntry.stat()
+        return os.stat(self.appimage)
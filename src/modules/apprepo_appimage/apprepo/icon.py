@@ -9,7 +9,6 @@
 # Unless required by applicable law or agreed to in writing, software
 # distributed under the License is distributed on an "AS IS" BASIS,
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
-import glob
 import pathlib
 
 
@@ -23,20 +22,16 @@ class AppImageIconFinder(object):
         if self.mountpoint is None:
             return None
 
-        pattern = '{}/*.svg'.format(self.mountpoint)
-        for path_temp_icon in glob.glob(pattern):
+        for path_temp_icon in self.mountpoint.glob('*.svg'):
             return path_temp_icon
 
-        pattern = '{}/*.png'.format(self.mountpoint)
-        for path_temp_icon in glob.glob(pattern):
+        for path_temp_icon in self.mountpoint.glob('*.png'):
             return path_temp_icon
 
-        pattern = '{}/*.jpg'.format(self.mountpoint)
-        for path_temp_icon in glob.glob(pattern):
+        for path_temp_icon in self.mountpoint.glob('*.jpg'):
             return path_temp_icon
 
-        pattern = '{}/*.ico'.format(self.mountpoint)
-        for path_temp_icon in glob.glob(pattern):
+        for path_temp_icon in self.mountpoint.glob('*.ico'):
             return path_temp_icon
 
         return None
@@ -0,0 +1,141 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import json
+import logging
+import os
+import threading
+import time
+
+
+class AppImageIndex(object):
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._records = None
+        self._listings = {}
+
+    @property
+    def records(self):
+        with self._lock:
+            if self._records is not None:
+                return self._records
+
+            self._records = {}
+            if self.path is None or not os.path.exists(self.path):
+                return self._records
+
+            try:
+                with open(self.path, 'r') as stream:
+                    self._records = json.load(stream)
+            except (ValueError, OSError) as ex:
+                logger = logging.getLogger('appimagetool')
+                logger.warning('integration index is broken, rebuilding: {}'.format(ex))
+
+            return self._records
+
+    def key(self, status):
+        return [status.st_dev, status.st_ino, status.st_size, status.st_mtime_ns]
+
+    def _listing(self, path):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return set()
+
+        with self._lock:
+            cached = self._listings.get(path, None)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+
+        listing = set(os.listdir(path))
+        with self._lock:
+            self._listings[path] = (mtime, listing)
+        return listing
+
+    def _exists(self, path):
+        if path is None: return False
+        return os.path.basename(path) in self._listing(os.path.dirname(path))
+
+    def get(self, appimage, status=None):
+        record = self.records.get(appimage, None)
+        if record is None: return None
+
+        if status is not None and record.get('key') != self.key(status):
+            return None
+
+        return record
+
+    def fresh(self, appimage, status, systemwide=False):
+        record = self.get(appimage, status)
+        if record is None: return False
+
+        if record.get('systemwide', False) != bool(systemwide):
+            return False
+
+        # The AppImage was replaced after the integration
+        if status.st_mtime_ns > record.get('integrated', 0):
+            return False
+
+        for path in (record.get('desktop'), record.get('icon'), record.get('alias')):
+            if not self._exists(path):
+                return False
+
+        return True
+
+    def record(self, appimage, status, desktop=None, icon=None, alias=None, systemwide=False):
+        with self._lock:
+            # The content hash stays valid as long as the file is the same
+            previous = self.get(appimage, status) or {}
+
+            self.records[appimage] = {
+                'key': self.key(status),
+                'desktop': desktop,
+                'icon': icon,
+                'alias': alias,
+                'systemwide': bool(systemwide),
+                'integrated': time.time_ns(),
+                'hash': previous.get('hash', None),
+            }
+
+    def hash(self, appimage, status, hash=None):
+        with self._lock:
+            record = self.get(appimage, status)
+            if record is None and hash is None:
+                return None
+
+            if record is None:
+                record = self.records.setdefault(appimage, {'key': self.key(status)})
+                record['key'] = self.key(status)
+
+            if hash is not None:
+                record['hash'] = hash
+            return record.get('hash', None)
+
+    def discard(self, appimage):
+        with self._lock:
+            self.records.pop(appimage, None)
+
+    def save(self):
+        if self.path is None:
+            return None
+
+        with self._lock:
+            folder = os.path.dirname(self.path)
+            if len(folder) and not os.path.exists(folder):
+                os.makedirs(folder, exist_ok=True)
+
+            temporary = '{}.{}.tmp'.format(self.path, os.getpid())
+            with open(temporary, 'w') as stream:
+                json.dump(self.records, stream)
+                stream.close()
+
+            os.replace(temporary, self.path)
@@ -0,0 +1,95 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+EVENT = struct.Struct('iIII')
+
+
+class Inotify(object):
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._watches = {}
+
+        self.descriptor = self._libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+        if self.descriptor < 0:
+            number = ctypes.get_errno()
+            raise OSError(number, os.strerror(number))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def fileno(self):
+        return self.descriptor
+
+    def add(self, path, mask):
+        watch = self._libc.inotify_add_watch(self.descriptor, os.fsencode(path), mask)
+        if watch < 0:
+            number = ctypes.get_errno()
+            raise OSError(number, '{}: {}'.format(path, os.strerror(number)))
+
+        self._watches[watch] = path
+        return watch
+
+    def read(self, timeout=None):
+        readable, writable, failed = select.select([self.descriptor], [], [], timeout)
+        if not readable:
+            return []
+
+        try:
+            buffer = os.read(self.descriptor, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        position = 0
+        while position + EVENT.size <= len(buffer):
+            watch, mask, cookie, length = EVENT.unpack_from(buffer, position)
+            position += EVENT.size
+
+            name = buffer[position:position + length].rstrip(b'\0')
+            position += length
+
+            if mask & IN_IGNORED:
+                self._watches.pop(watch, None)
+                continue
+
+            folder = self._watches.get(watch, None)
+            if folder is None:
+                continue
+
+            events.append((folder, os.fsdecode(name), mask))
+
+        return events
+
+    def close(self):
+        if self.descriptor is None or self.descriptor < 0:
+            return None
+
+        os.close(self.descriptor)
+        self.descriptor = None
@@ -0,0 +1,141 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import glob
+import logging
+import os
+import pty
+import select
+import signal
+import subprocess
+import time
+
+
+class AppImageMountError(Exception):
+    pass
+
+
+class AppImageMount(object):
+    def __init__(self, appimage, timeout=10, semaphore=None):
+        self.appimage = appimage
+        self.timeout = timeout
+        self.semaphore = semaphore
+
+        self.process = None
+        self.descriptor = None
+        self.mountpoint = None
+        self.latency = None
+        self._acquired = False
+
+    def __enter__(self):
+        try:
+            self.mount()
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def _readline(self, deadline):
+        output = b''
+        while b'\n' not in output:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise AppImageMountError('{}: mount timed out after {}s'.format(self.appimage, self.timeout))
+
+            readable, writable, failed = select.select([self.descriptor], [], [], remaining)
+            if not readable:
+                continue
+
+            try:
+                chunk = os.read(self.descriptor, 2048)
+            except OSError:
+                chunk = b''
+
+            if not chunk:
+                raise AppImageMountError('{}: exited before reporting a mount point'.format(self.appimage))
+            output += chunk
+
+        return str(output, 'utf-8', errors='ignore')
+
+    def mount(self):
+        logger = logging.getLogger('appimagetool')
+        # Waiting for a slot is not a slow mount, the timeout starts with the subprocess
+        if self.semaphore is not None:
+            self.semaphore.acquire()
+            self._acquired = True
+
+        started = time.monotonic()
+        deadline = started + self.timeout
+
+        self.descriptor, terminal = pty.openpty()
+        try:
+            self.process = subprocess.Popen(
+                [self.appimage, '--appimage-mount'], stdin=subprocess.DEVNULL,
+                stdout=terminal, stderr=subprocess.DEVNULL, start_new_session=True
+            )
+        finally:
+            os.close(terminal)
+
+        mountpoint = self._readline(deadline)
+        mountpoint = mountpoint.strip("\n\r")
+        if not os.path.isdir(mountpoint):
+            raise AppImageMountError('{}: mount point not found: {}'.format(self.appimage, mountpoint))
+
+        self.mountpoint = mountpoint
+        self.latency = time.monotonic() - started
+        logger.info('{}: mounted in {:.0f} ms'.format(self.appimage, self.latency * 1000))
+
+        return self
+
+    def close(self):
+        if self.process is not None:
+            self._terminate(self.process)
+            self.process = None
+
+        if self.descriptor is not None:
+            os.close(self.descriptor)
+            self.descriptor = None
+
+        if self._acquired:
+            self.semaphore.release()
+            self._acquired = False
+
+        self.mountpoint = None
+
+    def _terminate(self, process):
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            if process.poll() is not None:
+                return None
+
+            try:
+                os.killpg(process.pid, sig)
+            except ProcessLookupError:
+                pass
+
+            try:
+                process.wait(timeout=self.timeout)
+                return None
+            except subprocess.TimeoutExpired:
+                continue
+
+    def glob(self, pattern):
+        for path in glob.glob(os.path.join(self.mountpoint, pattern)):
+            yield os.path.relpath(path, self.mountpoint)
+
+    def exists(self, path):
+        if path is None: return False
+        return os.path.exists(os.path.join(self.mountpoint, path))
+
+    def open(self, path, mode='rb'):
+        return open(os.path.join(self.mountpoint, path), mode)
@@ -0,0 +1,351 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import fnmatch
+import io
+import lzma
+import os
+import posixpath
+import struct
+import threading
+import zlib
+
+from .elf import payload_offset
+
+SQUASHFS_MAGIC = 0x73717368
+
+COMPRESSION_GZIP = 1
+COMPRESSION_LZMA = 2
+COMPRESSION_LZO = 3
+COMPRESSION_XZ = 4
+COMPRESSION_LZ4 = 5
+COMPRESSION_ZSTD = 6
+
+INODE_DIRECTORY = (1, 8)
+INODE_FILE = (2, 9)
+INODE_SYMLINK = (3, 10)
+
+METADATA_SIZE = 8192
+METADATA_UNCOMPRESSED = 1 << 15
+DATA_UNCOMPRESSED = 1 << 24
+FRAGMENT_NONE = 0xFFFFFFFF
+
+SYMLINK_DEPTH = 16
+
+
+class SquashFsError(Exception):
+    pass
+
+
+class SquashFsInode(object):
+    def __init__(self, type, mode, mtime, number):
+        self.type = type
+        self.mode = mode
+        self.mtime = mtime
+        self.number = number
+
+        self.start_block = 0
+        self.file_size = 0
+        self.offset = 0
+        self.fragment = FRAGMENT_NONE
+        self.fragment_offset = 0
+        self.blocks = []
+        self.target = None
+
+    @property
+    def is_directory(self):
+        return self.type in INODE_DIRECTORY
+
+    @property
+    def is_file(self):
+        return self.type in INODE_FILE
+
+    @property
+    def is_symlink(self):
+        return self.type in INODE_SYMLINK
+
+
+class SquashFsMetadataReader(object):
+    def __init__(self, image, position, offset=0):
+        self.image = image
+        self.position = position
+        self.offset = offset
+
+    def read(self, size):
+        chunks = []
+        while size > 0:
+            block, following = self.image._metadata(self.position)
+            chunk = block[self.offset:self.offset + size]
+            if not chunk: raise SquashFsError('metadata block is truncated')
+            chunks.append(chunk)
+
+            size -= len(chunk)
+            self.offset += len(chunk)
+            if self.offset < len(block):
+                continue
+
+            self.position = following
+            self.offset = 0
+
+        return b''.join(chunks)
+
+    def unpack(self, format):
+        return struct.unpack(format, self.read(struct.calcsize(format)))
+
+
+class SquashFsImage(object):
+    def __init__(self, path, offset=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._fragments = {}
+        self._root = None
+
+        self._descriptor = os.open(path, os.O_RDONLY)
+        try:
+            if offset is None:
+                with os.fdopen(os.dup(self._descriptor), 'rb') as stream:
+                    offset = payload_offset(stream)
+            self.offset = offset
+            self._superblock()
+        except (ValueError, struct.error) as ex:
+            self.close()
+            raise SquashFsError('{}: {}'.format(path, ex))
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def _pread(self, size, position):
+        data = os.pread(self._descriptor, size, self.offset + position)
+        if len(data) != size: raise SquashFsError('unexpected end of file: {}'.format(self.path))
+        return data
+
+    def _superblock(self):
+        (magic, self.inode_count, self.mtime, self.block_size, self.fragment_count,
+         self.compression, self.block_log, self.flags, self.id_count, major, minor,
+         self.root_inode, self.bytes_used, self.id_table, self.xattr_table,
+         self.inode_table, self.directory_table, self.fragment_table,
+         self.export_table) = struct.unpack('<5I6H8Q', self._pread(96, 0))
+
+        if magic != SQUASHFS_MAGIC:
+            raise SquashFsError('squashfs superblock not found: {}'.format(self.path))
+
+        if (major, minor) != (4, 0):
+            raise SquashFsError('unsupported squashfs version: {}.{}'.format(major, minor))
+
+        if self.compression not in (COMPRESSION_GZIP, COMPRESSION_LZMA, COMPRESSION_XZ, COMPRESSION_ZSTD):
+            raise SquashFsError('unsupported squashfs compression: {}'.format(self.compression))
+
+        if self.compression == COMPRESSION_ZSTD:
+            try:
+                import zstandard
+            except ImportError:
+                raise SquashFsError('zstd compressed image, python zstandard module not found')
+            self._zstd = zstandard.ZstdDecompressor()
+
+    def _decompress(self, data):
+        if self.compression == COMPRESSION_GZIP:
+            return zlib.decompress(data)
+        if self.compression == COMPRESSION_XZ:
+            return lzma.decompress(data, format=lzma.FORMAT_XZ)
+        if self.compression == COMPRESSION_LZMA:
+            return lzma.decompress(data, format=lzma.FORMAT_ALONE)
+        if self.compression == COMPRESSION_ZSTD:
+            return self._zstd.decompressobj().decompress(data)
+        raise SquashFsError('unsupported squashfs compression: {}'.format(self.compression))
+
+    def _metadata(self, position):
+        with self._lock:
+            if position in self._cache:
+                return self._cache[position]
+
+        header, = struct.unpack('<H', self._pread(2, position))
+        size = header & ~METADATA_UNCOMPRESSED
+        data = self._pread(size, position + 2)
+        if not header & METADATA_UNCOMPRESSED:
+            data = self._decompress(data)
+
+        with self._lock:
+            self._cache[position] = (data, position + 2 + size)
+            return self._cache[position]
+
+    def _data(self, position, header, size):
+        length = header & ~DATA_UNCOMPRESSED
+        if not length:
+            return bytes(size)
+
+        data = self._pread(length, position)
+        if header & DATA_UNCOMPRESSED:
+            return data
+        return self._decompress(data)
+
+    def _inode(self, reference):
+        reader = SquashFsMetadataReader(self, self.inode_table + (reference >> 16), reference & 0xFFFF)
+
+        type, mode, uid, gid, mtime, number = reader.unpack('<4H2I')
+        inode = SquashFsInode(type, mode, mtime, number)
+
+        if type == 1:
+            inode.start_block, nlink, inode.file_size, inode.offset, parent = reader.unpack('<2I2HI')
+        elif type == 8:
+            nlink, inode.file_size, inode.start_block, parent, count, inode.offset, xattr = reader.unpack('<4I2HI')
+        elif type == 2:
+            inode.start_block, inode.fragment, inode.fragment_offset, inode.file_size = reader.unpack('<4I')
+        elif type == 9:
+            inode.start_block, inode.file_size, sparse, nlink, inode.fragment, inode.fragment_offset, xattr = \
+                reader.unpack('<3Q4I')
+        elif type in INODE_SYMLINK:
+            nlink, size = reader.unpack('<2I')
+            inode.target = reader.read(size).decode('utf-8', errors='surrogateescape')
+
+        if inode.is_file:
+            count = inode.file_size // self.block_size
+            if inode.fragment == FRAGMENT_NONE and inode.file_size % self.block_size:
+                count += 1
+            inode.blocks = reader.unpack('<{}I'.format(count)) if count else ()
+
+        return inode
+
+    def _listing(self, inode):
+        if not inode.is_directory:
+            raise SquashFsError('not a directory')
+
+        listing = {}
+
+        # The directory size includes the implicit "." and ".." entries
+        remaining = inode.file_size - 3
+        if remaining <= 0:
+            return listing
+
+        reader = SquashFsMetadataReader(self, self.directory_table + inode.start_block, inode.offset)
+        while remaining > 0:
+            count, start_block, number = reader.unpack('<3I')
+            remaining -= 12
+
+            for index in range(count + 1):
+                offset, number_delta, type, size = reader.unpack('<HhHH')
+                name = reader.read(size + 1).decode('utf-8', errors='surrogateescape')
+                remaining -= 8 + size + 1
+
+                listing[name] = (start_block << 16) | offset
+
+        return listing
+
+    def _fragment(self, index):
+        with self._lock:
+            if index in self._fragments:
+                return self._fragments[index]
+
+        pointer = self.fragment_table + (index // 512) * 8
+        position, = struct.unpack('<Q', self._pread(8, pointer))
+        reader = SquashFsMetadataReader(self, position, (index % 512) * 16)
+        start, header, unused = reader.unpack('<QII')
+
+        data = self._data(start, header, self.block_size)
+        with self._lock:
+            self._fragments[index] = data
+            return data
+
+    def _lookup(self, path, follow=True):
+        if self._root is None:
+            self._root = self._inode(self.root_inode)
+
+        components = [x for x in path.split('/') if x and x != '.']
+        parents, inode, depth = [], self._root, 0
+
+        while len(components):
+            name = components.pop(0)
+            if name == '..':
+                inode = parents.pop() if len(parents) else self._root
+                continue
+
+            listing = self._listing(inode)
+            if name not in listing:
+                return None
+
+            parents.append(inode)
+            inode = self._inode(listing[name])
+            if not inode.is_symlink or (not follow and not len(components)):
+                continue
+
+            depth += 1
+            if depth > SYMLINK_DEPTH:
+                raise SquashFsError('too many levels of symbolic links: {}'.format(path))
+
+            target, inode = inode.target, parents.pop()
+            if target.startswith('/'):
+                parents, inode = [], self._root
+            components = [x for x in target.split('/') if x and x != '.'] + components
+
+        return inode
+
+    def listdir(self, path='/'):
+        inode = self._lookup(path)
+        if inode is None:
+            raise FileNotFoundError(path)
+        return list(self._listing(inode).keys())
+
+    def glob(self, pattern):
+        directory, pattern = posixpath.split(pattern)
+        for name in self.listdir(directory or '/'):
+            if name.startswith('.') and not pattern.startswith('.'):
+                continue
+            if fnmatch.fnmatchcase(name, pattern):
+                yield posixpath.join(directory, name)
+
+    def exists(self, path):
+        if path is None:
+            return False
+
+        try:
+            return self._lookup(path) is not None
+        except SquashFsError:
+            return False
+
+    def read(self, path):
+        inode = self._lookup(path)
+        if inode is None:
+            raise FileNotFoundError(path)
+        if not inode.is_file:
+            raise SquashFsError('not a regular file: {}'.format(path))
+
+        chunks = []
+        position = inode.start_block
+        remaining = inode.file_size
+        for header in inode.blocks:
+            size = min(self.block_size, remaining)
+            chunks.append(self._data(position, header, size)[:size])
+            position += header & ~DATA_UNCOMPRESSED
+            remaining -= size
+
+        if remaining > 0 and inode.fragment != FRAGMENT_NONE:
+            fragment = self._fragment(inode.fragment)
+            chunks.append(fragment[inode.fragment_offset:inode.fragment_offset + remaining])
+
+        return b''.join(chunks)
+
+    def open(self, path, mode='rb'):
+        if 'b' in mode:
+            return io.BytesIO(self.read(path))
+        return io.StringIO(self.read(path).decode('utf-8', errors='ignore'))
+
+    def close(self):
+        if self._descriptor is None:
+            return None
+
+        os.close(self._descriptor)
+        self._descriptor = None
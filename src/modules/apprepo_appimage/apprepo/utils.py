@@ -9,11 +9,133 @@
 # Unless required by applicable law or agreed to in writing, software
 # distributed under the License is distributed on an "AS IS" BASIS,
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import errno
+import fcntl
+import io
+import os
+import shutil
+import stat
 
 
-class EqualsSpaceRemover(object):
-    def __init__(self, origin):
-        self.origin = origin
+FICLONE = 0x40049409
+BUFFER_SIZE = 1024 * 1024
 
-    def write(self, what):
-        self.origin.write(what.replace(" = ", "=", 1))
+
+def _copy_reflink(source, destination, start, target, length, copied):
+    # A clone always covers the whole file, it only fits a fresh copy
+    if copied or start or target or os.fstat(destination).st_size:
+        raise OSError(errno.EINVAL, 'partial copies can not be cloned')
+    fcntl.ioctl(destination, FICLONE, source)
+    return length
+
+
+def _copy_file_range(source, destination, start, target, length, copied):
+    while copied < length:
+        count = os.copy_file_range(source, destination, min(BUFFER_SIZE * 64, length - copied),
+                                   start + copied, target + copied)
+        if not count: return copied
+        copied += count
+    return copied
+
+
+def _copy_sendfile(source, destination, start, target, length, copied):
+    os.lseek(destination, target + copied, os.SEEK_SET)
+    while copied < length:
+        count = os.sendfile(destination, source, start + copied, min(BUFFER_SIZE * 64, length - copied))
+        if not count: return copied
+        copied += count
+    return copied
+
+
+def _copy_buffered(source, destination, start, target, length, copied):
+    while copied < length:
+        chunk = os.pread(source, min(BUFFER_SIZE, length - copied), start + copied)
+        if not len(chunk): return copied
+        view = memoryview(chunk)
+        written = 0
+        while written < len(chunk):
+            written += os.pwrite(destination, view[written:], target + copied + written)
+        copied += len(chunk)
+    return copied
+
+
+def copyfileobj(source, destination):
+    try:
+        descriptor_source = source.fileno()
+        descriptor_destination = destination.fileno()
+        if not stat.S_ISREG(os.fstat(descriptor_source).st_mode):
+            raise io.UnsupportedOperation('not a regular file')
+        start, target = source.tell(), destination.tell()
+    except (AttributeError, OSError):
+        shutil.copyfileobj(source, destination, BUFFER_SIZE)
+        return None
+
+    destination.flush()
+
+    # Like shutil.copyfileobj, the rest of the source
+    # goes to the current position of the destination
+    length = max(0, os.fstat(descriptor_source).st_size - start)
+    size = os.fstat(descriptor_destination).st_size
+
+    # Start with the most efficient method and step down on failure,
+    # a method that failed halfway leaves its progress in the destination
+    copied = 0
+    methods = [_copy_reflink, _copy_sendfile, _copy_buffered]
+    if hasattr(os, 'copy_file_range'):
+        methods.insert(1, _copy_file_range)
+
+    for method in methods:
+        try:
+            copied = method(descriptor_source, descriptor_destination, start, target, length, copied)
+            break
+        except OSError as ex:
+            if method is _copy_buffered: raise ex
+            # Progress shows in the size only while the copy appends to the file
+            copied = min(length, max(0, os.fstat(descriptor_destination).st_size - target)) \
+                if size <= target else 0
+            continue
+
+    source.seek(start + copied)
+    destination.seek(target + copied)
+    return None
+
+
+def copyfile(source, destination):
+    with open(source, 'rb') as stream_source:
+        with open(destination, 'wb') as stream_destination:
+            copyfileobj(stream_source, stream_destination)
+    return destination
+
+
+def fsync(path):
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def move(source, destination):
+    try:
+        os.rename(source, destination)
+        return destination
+    except OSError as ex:
+        if ex.errno != errno.EXDEV:
+            raise ex
+
+    temporary = os.path.join(
+        os.path.dirname(destination),
+        '.{}.part'.format(os.path.basename(destination))
+    )
+
+    try:
+        copyfile(source, temporary)
+        shutil.copymode(source, temporary)
+        fsync(temporary)
+        os.replace(temporary, destination)
+    finally:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+
+    os.unlink(source)
+    return destination
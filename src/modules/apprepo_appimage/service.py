@@ -10,9 +10,13 @@
 # Unless required by applicable law or agreed to in writing, software
 # distributed under the License is distributed on an "AS IS" BASIS,
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import os
+
 import hexdi
 
 from .apprepo.appimage import AppImage
+from .apprepo.chunks import ChunkStore
+from .apprepo.index import AppImageIndex
 
 
 @hexdi.permanent('appimagetool')
@@ -25,6 +29,22 @@ class ServiceAppImageInstance(AppImage):
         applications_local = config.get('applications.local', '~/Applications')
         applications_local = applications_local.split(':')
 
+        # 0 means one worker per cpu core
+        workers = int(config.get('integration.workers', 0))
+        mounts = int(config.get('integration.mounts', 4))
+        timeout = float(config.get('integration.timeout', 10))
+
+        index = config.get('integration.index', '~/.cache/apprepo/integration.json')
+        index = AppImageIndex(os.path.expanduser(index))
+
+        # Empty keeps every AppImage as a plain file, a path enables
+        # the shared chunk store installs are deduplicated through
+        storage = config.get('install.storage', '')
+        storage = ChunkStore(os.path.expanduser(storage)) if len(storage) else None
+
+        # Replaced versions kept per package for the rollback, 0 keeps none
+        versions = int(config.get('versions.keep', 2))
+
         return super(ServiceAppImageInstance, self).__init__(
-            applications_local, applications_global
+            applications_local, applications_global, workers, mounts, index, timeout, storage, versions
         )
@@ -0,0 +1,163 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import fnmatch
+import hashlib
+import logging
+import os
+import tempfile
+
+import requests
+
+from .zsync import ZsyncControl
+from .zsync import ZsyncError
+from .zsync import ZsyncMatcher
+
+
+class ServiceDelta(object):
+    def __init__(self, budget=60, gap=64 * 1024, timeout=30, session=None):
+        self.session = session or requests.Session()
+        self.budget = budget
+        self.gap = gap
+        self.timeout = timeout
+
+    def _github(self, user, repository, tag, pattern):
+        url = 'https://api.github.com/repos/{}/{}/releases/tags/{}'.format(user, repository, tag)
+        if tag == 'latest':
+            url = 'https://api.github.com/repos/{}/{}/releases/latest'.format(user, repository)
+
+        response = self.session.get(url, timeout=self.timeout)
+        if response is None or response.status_code not in [200]:
+            raise ZsyncError('{}: release not found'.format(url))
+
+        for asset in response.json().get('assets', []):
+            if not fnmatch.fnmatch(asset.get('name', ''), pattern): continue
+            return asset.get('browser_download_url', None)
+
+        raise ZsyncError('{}: no asset matches {}'.format(url, pattern))
+
+    def control_url(self, information):
+        fields = information.split('|')
+        if fields[0] == 'zsync' and len(fields) == 2:
+            return fields[1]
+
+        if fields[0] == 'gh-releases-zsync' and len(fields) == 5:
+            return self._github(*fields[1:])
+
+        raise ZsyncError('unsupported update information: {}'.format(information))
+
+    def control(self, information):
+        url = self.control_url(information)
+
+        response = self.session.get(url, timeout=self.timeout)
+        if response is None or response.status_code not in [200]:
+            raise ZsyncError('{}: can not download the zsync control file'.format(url))
+
+        return ZsyncControl(response.content, response.url)
+
+    def _destination(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=folder, prefix='.', suffix='.part', delete=False)
+
+    def _copy(self, source, destination, found, control):
+        blocks = sorted(found.keys())
+
+        runs = []
+        for block in blocks:
+            start, length = found[block], control.size(block)
+            if len(runs) and runs[-1][0] + runs[-1][2] == block * control.blocksize \
+                    and runs[-1][1] + runs[-1][2] == start:
+                runs[-1][2] += length
+                continue
+            runs.append([block * control.blocksize, start, length])
+
+        reused = 0
+        descriptor = os.open(source, os.O_RDONLY)
+        try:
+            for target, start, length in runs:
+                while length > 0:
+                    data = os.pread(descriptor, min(length, 1024 * 1024), start)
+                    if not data: raise ZsyncError('{}: changed while reading'.format(source))
+                    os.pwrite(destination, data, target)
+
+                    target += len(data)
+                    start += len(data)
+                    length -= len(data)
+                    reused += len(data)
+        finally:
+            os.close(descriptor)
+
+        return reused
+
+    def _fetch(self, url, ranges, destination):
+        fetched = 0
+        for start, end in ranges:
+            headers = {'Range': 'bytes={}-{}'.format(start, end - 1)}
+            response = self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+            if response is None or response.status_code not in [206]:
+                raise ZsyncError('{}: range requests are not supported'.format(url))
+
+            position = start
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                if not chunk: break
+                os.pwrite(destination, chunk, position)
+                position += len(chunk)
+
+            if position != end:
+                raise ZsyncError('{}: expected {} bytes, got {}'.format(url, end - start, position - start))
+            fetched += end - start
+
+        return fetched
+
+    def _hash(self, path, block_size=1024 * 1024):
+        hash = hashlib.sha1()
+        with open(path, 'rb') as stream:
+            while True:
+                data = stream.read(block_size)
+                if not data: break
+                hash.update(data)
+        return hash.hexdigest()
+
+    def update(self, appimage, information, hash=None, folder=None):
+        logger = logging.getLogger('delta')
+
+        control = self.control(information)
+        if hash is not None and control.sha1 is not None and control.sha1 != hash.lower():
+            raise ZsyncError('{}: update information points to another version'.format(appimage))
+
+        matcher = ZsyncMatcher(control)
+        found = matcher.match(appimage, self.budget)
+        ranges = matcher.missing(found, self.gap)
+
+        with self._destination(folder or os.path.dirname(appimage)) as stream:
+            try:
+                os.ftruncate(stream.fileno(), control.length)
+                reused = self._copy(appimage, stream.fileno(), found, control)
+                fetched = self._fetch(control.url, ranges, stream.fileno())
+                stream.close()
+
+                # The rebuilt file must be exactly the one the
+                # repository published before it may replace anything
+                digest = self._hash(stream.name)
+                if control.sha1 is not None and digest != control.sha1:
+                    raise ZsyncError('{}: rebuilt file does not match the zsync checksum'.format(appimage))
+                if hash is not None and digest != hash.lower():
+                    raise ZsyncError('{}: rebuilt file does not match the repository hash'.format(appimage))
+
+            except Exception:
+                os.unlink(stream.name)
+                raise
+
+        logger.info('{}: reused {} bytes, fetched {} bytes in {} requests'.format(
+            appimage, reused, fetched, len(ranges)
+        ))
+
+        return (stream.name, reused, fetched)
@@ -0,0 +1,27 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import hexdi
+
+from .delta import ServiceDelta
+
+
+@hexdi.permanent('delta')
+class ServiceDeltaInstance(ServiceDelta):
+    @hexdi.inject('config', 'http')
+    def __init__(self, config, http):
+        # Seconds to spend matching blocks of the installed file
+        # before the rest is fetched from the server anyway
+        budget = float(config.get('delta.budget', 60))
+        gap = int(config.get('delta.gap', 64 * 1024))
+        timeout = float(config.get('delta.timeout', 30))
+
+        return super(ServiceDeltaInstance, self).__init__(budget, gap, timeout, http)
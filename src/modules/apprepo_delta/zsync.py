@@ -0,0 +1,401 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import collections
+import ctypes
+import ctypes.util
+import functools
+import hashlib
+import itertools
+import logging
+import mmap
+import os
+import struct
+import time
+from urllib.parse import urljoin
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MASK = 0xffffffff
+
+# Positions whose weak checksums are computed in one go
+SCAN_SIZE = 256 * 1024
+
+
+class ZsyncError(Exception):
+    pass
+
+
+def _rotate(value, shift):
+    value &= MASK
+    return ((value << shift) | (value >> (32 - shift))) & MASK
+
+
+def _md4(data):
+    length = len(data)
+    data = bytes(data) + b'\x80' + b'\0' * ((55 - length) % 64) + struct.pack('<Q', length * 8 & 0xffffffffffffffff)
+
+    a, b, c, d = 0x67452301, 0xefcdab89, 0x98badcfe, 0x10325476
+    for offset in range(0, len(data), 64):
+        x = struct.unpack_from('<16I', data, offset)
+        aa, bb, cc, dd = a, b, c, d
+
+        for i in (0, 4, 8, 12):
+            a = _rotate(a + ((b & c) | (~b & d)) + x[i], 3)
+            d = _rotate(d + ((a & b) | (~a & c)) + x[i + 1], 7)
+            c = _rotate(c + ((d & a) | (~d & b)) + x[i + 2], 11)
+            b = _rotate(b + ((c & d) | (~c & a)) + x[i + 3], 19)
+
+        for i in (0, 1, 2, 3):
+            a = _rotate(a + ((b & c) | (b & d) | (c & d)) + x[i] + 0x5a827999, 3)
+            d = _rotate(d + ((a & b) | (a & c) | (b & c)) + x[i + 4] + 0x5a827999, 5)
+            c = _rotate(c + ((d & a) | (d & b) | (a & b)) + x[i + 8] + 0x5a827999, 9)
+            b = _rotate(b + ((c & d) | (c & a) | (d & a)) + x[i + 12] + 0x5a827999, 13)
+
+        for i in (0, 2, 1, 3):
+            a = _rotate(a + (b ^ c ^ d) + x[i] + 0x6ed9eba1, 3)
+            d = _rotate(d + (a ^ b ^ c) + x[i + 8] + 0x6ed9eba1, 9)
+            c = _rotate(c + (d ^ a ^ b) + x[i + 4] + 0x6ed9eba1, 11)
+            b = _rotate(b + (c ^ d ^ a) + x[i + 12] + 0x6ed9eba1, 15)
+
+        a, b, c, d = (a + aa) & MASK, (b + bb) & MASK, (c + cc) & MASK, (d + dd) & MASK
+
+    return struct.pack('<4I', a, b, c, d)
+
+
+def _md4_provider():
+    # OpenSSL 3 moved md4 to the legacy provider, so it is
+    # often missing from hashlib even on current systems
+    try:
+        hashlib.new('md4', b'')
+        return lambda data: hashlib.new('md4', data).digest()
+    except ValueError:
+        pass
+
+    try:
+        from Crypto.Hash import MD4
+        return lambda data: MD4.new(bytes(data)).digest()
+    except ImportError:
+        pass
+
+    # The low level MD4() of libcrypto does not need the legacy provider
+    try:
+        function = ctypes.CDLL(ctypes.util.find_library('crypto') or 'libcrypto.so').MD4
+        function.restype = ctypes.c_void_p
+        function.argtypes = [ctypes.c_char_p, ctypes.c_size_t, ctypes.c_char_p]
+
+        def md4(data):
+            data = bytes(data)
+            digest = ctypes.create_string_buffer(16)
+            function(data, len(data), digest)
+            return digest.raw
+
+        if md4(b'') == _md4(b''):
+            return md4
+    except (OSError, AttributeError):
+        pass
+
+    return _md4
+
+
+md4 = _md4_provider()
+
+
+@functools.lru_cache(maxsize=4)
+def _weights(length):
+    return numpy.arange(length, 0, -1, dtype=numpy.int64)
+
+
+def rsum(block):
+    # The zsync weak checksum: a is the plain sum of the bytes,
+    # b weights every byte with its distance to the end of the block
+    if numpy is not None:
+        data = numpy.frombuffer(block, numpy.uint8)
+        return (int(data.sum()) & 0xffff, int(numpy.dot(data, _weights(len(data)))) & 0xffff)
+    return (sum(block) & 0xffff, sum(itertools.accumulate(block)) & 0xffff)
+
+
+class ZsyncControl(object):
+    def __init__(self, data, url=None):
+        separator = data.find(b'\n\n')
+        if separator < 0:
+            raise ZsyncError('zsync control file has no header')
+
+        self.headers = {}
+        for line in str(data[:separator], 'utf-8', errors='ignore').split('\n'):
+            key, found, value = line.partition(':')
+            if not found: continue
+            self.headers.setdefault(key.strip(), value.strip())
+
+        try:
+            self.blocksize = int(self.headers['Blocksize'])
+            self.length = int(self.headers['Length'])
+            self.seq_matches, self.rsum_bytes, self.checksum_bytes = \
+                [int(value) for value in self.headers.get('Hash-Lengths', '1,4,16').split(',')]
+        except (KeyError, ValueError) as ex:
+            raise ZsyncError('zsync control file is broken: {}'.format(ex))
+
+        if 'URL' not in self.headers.keys():
+            raise ZsyncError('zsync control file has no uncompressed URL')
+
+        self.url = urljoin(url or '', self.headers['URL'])
+        self.filename = self.headers.get('Filename', None)
+
+        self.sha1 = self.headers.get('SHA-1', None)
+        self.sha1 = self.sha1.lower() if self.sha1 else None
+
+        self.mask = (1 << (8 * self.rsum_bytes)) - 1
+        self.blocks = (self.length + self.blocksize - 1) // self.blocksize
+
+        size = self.rsum_bytes + self.checksum_bytes
+        body = data[separator + 2:]
+        if len(body) < self.blocks * size:
+            raise ZsyncError('zsync control file is truncated')
+
+        self.rsums = []
+        self.checksums = []
+        for position in range(0, self.blocks * size, size):
+            self.rsums.append(int.from_bytes(body[position:position + self.rsum_bytes], 'big'))
+            self.checksums.append(body[position + self.rsum_bytes:position + size])
+
+    def key(self, a, b):
+        return ((a << 16) | b) & self.mask
+
+    def size(self, block):
+        return min(self.blocksize, self.length - block * self.blocksize)
+
+
+class ZsyncMatcher(object):
+    def __init__(self, control):
+        self.control = control
+
+        self.targets = {}
+        for block, value in enumerate(control.rsums):
+            self.targets.setdefault(value, []).append(block)
+
+        self._digest = (None, None)
+        self._following = (None, None)
+
+    def _window(self, local, position):
+        block = local[position:position + self.control.blocksize]
+        if len(block) == self.control.blocksize:
+            return block
+        return block.ljust(self.control.blocksize, b'\0')
+
+    def _verify(self, local, position, candidates, found):
+        control = self.control
+        length = control.checksum_bytes
+
+        # The next block was already hashed when this one was verified
+        cached, digest = self._digest
+        if cached != position: digest = None
+
+        following = None
+        matched = []
+        for block in candidates:
+            if block in found: continue
+
+            # Short checksums are only reliable for two blocks in a row,
+            # the cheap weak checksum of the next block goes first
+            if control.seq_matches > 1 and block + 1 < control.blocks:
+                if following is None:
+                    following = self._window(local, position + control.blocksize)
+                    following = (rsum(following), following, None)
+                    self._following = (position + control.blocksize, following[0])
+
+                weak, window, checksum = following
+                if control.key(*weak) != control.rsums[block + 1]: continue
+
+                if checksum is None:
+                    checksum = md4(window)[:length]
+                    following = (weak, window, checksum)
+                    self._digest = (position + control.blocksize, checksum)
+                if checksum != control.checksums[block + 1]: continue
+
+            if digest is None:
+                digest = md4(self._window(local, position))[:length]
+            if digest != control.checksums[block]: continue
+
+            matched.append(block)
+
+        return matched
+
+    def _rsum(self, local, position):
+        # After a match the weak checksum of the next block is known from the verification
+        cached, weak = self._following
+        if cached == position:
+            return weak
+        return rsum(self._window(local, position))
+
+    def _scan(self, local, start, end, size):
+        blocksize = self.control.blocksize
+
+        # Weak checksums of all positions at once from two prefix sums:
+        # a = S[i + n] - S[i], b = (i + n) * a - (T[i + n] - T[i]) with T over k * x[k]
+        data = numpy.frombuffer(local, numpy.uint8, min(size, end + blocksize) - start, start)
+        data = numpy.concatenate([data.astype(numpy.int64), numpy.zeros(end + blocksize - start - len(data), numpy.int64)])
+
+        sums = numpy.concatenate([[0], numpy.cumsum(data)])
+        weighted = numpy.concatenate([[0], numpy.cumsum(data * numpy.arange(len(data)))])
+
+        count = end - start
+        a = sums[blocksize:blocksize + count] - sums[:count]
+        b = numpy.arange(blocksize, blocksize + count) * a - (weighted[blocksize:blocksize + count] - weighted[:count])
+
+        keys = (((a & 0xffff) << 16) | (b & 0xffff)) & self.control.mask
+        index = numpy.minimum(numpy.searchsorted(self._keys, keys), len(self._keys) - 1)
+        positions = numpy.nonzero(self._keys[index] == keys)[0]
+        return zip((positions + start).tolist(), keys[positions].tolist())
+
+    def _match_vectorized(self, path, local, size, found, budget, started):
+        logger = logging.getLogger('delta')
+        control = self.control
+        self._keys = numpy.array(sorted(self.targets.keys()), numpy.int64)
+
+        hits = collections.deque()
+        scanned, step = 0, control.blocksize
+
+        position = 0
+        while position < size:
+            candidate = None
+
+            # Right after a match the next block usually matches as well,
+            # its weak checksum is known and nothing has to be scanned
+            cached, weak = self._following
+            if cached == position and control.key(*weak) in self.targets:
+                candidate = (position, control.key(*weak))
+
+            while candidate is None:
+                while len(hits) and hits[0][0] < position:
+                    hits.popleft()
+                if len(hits):
+                    candidate = hits.popleft()
+                    break
+                if scanned >= size:
+                    return found
+
+                # Small steps near a match, whole chunks through changed data
+                start = max(scanned, position)
+                scanned = min(size, start + step)
+                hits.extend(self._scan(local, start, scanned, size))
+                step = min(step * 2, SCAN_SIZE)
+
+                if budget is not None and time.monotonic() - started > budget:
+                    logger.warning('{}: matching stopped after {}s at {} of {} bytes'.format(
+                        path, budget, start, size
+                    ))
+                    return found
+
+            position, key = candidate
+            matched = self._verify(local, position, self.targets[key], found)
+            if not len(matched):
+                position += 1
+                continue
+
+            for block in matched:
+                found[block] = position
+            if len(found) == control.blocks:
+                return found
+
+            position += control.blocksize
+            step = control.blocksize
+
+        return found
+
+    def match(self, path, budget=None):
+        logger = logging.getLogger('delta')
+        control = self.control
+        blocksize = control.blocksize
+
+        found = {}
+        self._digest = (None, None)
+        self._following = (None, None)
+        with open(path, 'rb') as stream:
+            size = os.fstat(stream.fileno()).st_size
+            if not size: return found
+
+            with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as local:
+                started = time.monotonic()
+
+                if numpy is not None:
+                    self._match_vectorized(path, local, size, found, budget, started)
+                    logger.info('{}: {} of {} blocks matched in {:.1f}s'.format(
+                        path, len(found), control.blocks, time.monotonic() - started
+                    ))
+                    return found
+
+                checkpoint = 0
+
+                targets = self.targets
+                mask = control.mask
+
+                position = 0
+                a, b = rsum(self._window(local, position))
+                while position < size:
+                    candidates = targets.get(((a << 16) | b) & mask, None)
+                    if candidates is not None:
+                        matched = self._verify(local, position, candidates, found)
+                        if len(matched):
+                            for block in matched:
+                                found[block] = position
+                            if len(found) == control.blocks:
+                                break
+
+                            position += blocksize
+                            if position >= size: break
+                            a, b = self._rsum(local, position)
+                            continue
+
+                    # Scanning a file that changed completely costs more than
+                    # downloading it, the missing blocks are fetched instead
+                    if position >= checkpoint:
+                        checkpoint = position + 1024 * 1024
+                        if budget is not None and time.monotonic() - started > budget:
+                            logger.warning('{}: matching stopped after {}s at {} of {} bytes'.format(
+                                path, budget, position, size
+                            ))
+                            break
+
+                    outgoing = local[position]
+                    incoming = local[position + blocksize] if position + blocksize < size else 0
+
+                    a = (a - outgoing + incoming) & 0xffff
+                    b = (b - blocksize * outgoing + a) & 0xffff
+                    position += 1
+
+                logger.info('{}: {} of {} blocks matched in {:.1f}s'.format(
+                    path, len(found), control.blocks, time.monotonic() - started
+                ))
+
+        return found
+
+    def missing(self, found, gap=0):
+        control = self.control
+
+        ranges = []
+        for block in range(control.blocks):
+            if block in found: continue
+
+            start = block * control.blocksize
+            end = start + control.size(block)
+
+            # Close ranges are fetched together, one request
+            # costs more than a few blocks of extra payload
+            if len(ranges) and start - ranges[-1][1] <= gap:
+                ranges[-1][1] = end
+                continue
+
+            ranges.append([start, end])
+
+        return ranges
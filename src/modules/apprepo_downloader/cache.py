@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import logging
+import os
+import re
+import threading
+
+from modules.apprepo_appimage.apprepo.utils import copyfile
+
+
+class DownloadCache(object):
+    def __init__(self, path, size=2 * 1024 * 1024 * 1024):
+        self.path = path
+        self.size = size
+        self._lock = threading.Lock()
+
+    def _entry(self, hash):
+        if not re.match('^[0-9a-f]{40}$', hash or ''):
+            return None
+        return os.path.join(self.path, hash)
+
+    def _link(self, source, destination):
+        if os.path.exists(destination):
+            os.unlink(destination)
+
+        # A hardlink costs nothing, a clone or a copy is
+        # the price of crossing the filesystem boundary
+        try:
+            os.link(source, destination)
+        except OSError:
+            copyfile(source, destination)
+        return destination
+
+    def _used(self, entry):
+        return os.path.join(os.path.dirname(entry), '.{}.used'.format(os.path.basename(entry)))
+
+    def _touch(self, entry):
+        # The entry may be the installed file itself, the last use
+        # goes to a sidecar and the entry keeps its modification time
+        with open(self._used(entry), 'a'):
+            pass
+        os.utime(self._used(entry))
+
+    def _last_use(self, entry, status):
+        try:
+            return os.stat(self._used(entry)).st_mtime_ns
+        except OSError:
+            return status.st_mtime_ns
+
+    def get(self, hash, destination):
+        entry = self._entry(hash.lower() if hash else None)
+        if entry is None or not os.path.isfile(entry):
+            return None
+
+        self._touch(entry)
+
+        folder = os.path.dirname(destination)
+        if len(folder): os.makedirs(folder, exist_ok=True)
+
+        # A clone or a copy, whatever the caller does to the file
+        # never reaches the cache entry or an installation linked to it
+        if os.path.exists(destination):
+            os.unlink(destination)
+        return copyfile(entry, destination)
+
+    def put(self, path, hash):
+        entry = self._entry(hash.lower() if hash else None)
+        if entry is None or self.size <= 0:
+            return None
+
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+
+            temporary = os.path.join(self.path, '.{}.tmp'.format(os.path.basename(entry)))
+            try:
+                self._link(path, temporary)
+                os.replace(temporary, entry)
+                self._touch(entry)
+            finally:
+                if os.path.exists(temporary):
+                    os.unlink(temporary)
+
+        self.evict()
+        return entry
+
+    def evict(self):
+        logger = logging.getLogger('downloader')
+        if not os.path.isdir(self.path):
+            return []
+
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.path):
+                if not self._entry(entry.name): continue
+
+                status = entry.stat()
+                # Files still linked from an installation take no extra space
+                if status.st_nlink > 1: continue
+                entries.append((self._last_use(entry.path, status), status.st_size, entry.path))
+
+            total = sum([size for mtime, size, path in entries])
+
+            removed = []
+            for mtime, size, path in sorted(entries):
+                if total <= self.size: break
+
+                os.unlink(path)
+                if os.path.exists(self._used(path)):
+                    os.unlink(self._used(path))
+                removed.append(path)
+                total -= size
+
+            if len(removed):
+                logger.info('download cache: evicted {} files, {} bytes left'.format(len(removed), total))
+
+            return removed
@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import logging
+import os
+import queue
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+import urllib3
+
+from modules.apprepo_http.mirrors import MirrorSet
+from modules.apprepo_http.mirrors import rebase
+from modules.apprepo_progress.progress import ServiceProgress
+from .partial import PartialDownload
+
+
+class SegmentError(Exception):
+    pass
+
+
+class ServiceDownloader(object):
+    def __init__(self, segments=4, segment_size=4 * 1024 * 1024, threshold=16 * 1024 * 1024, timeout=30,
+                 partial=None, cache=None, session=None, progress=None, buffer_size=1024 * 1024,
+                 mirrors=None, hedge=0.9, cooldown=30):
+        self.segments = segments
+        self.segment_size = segment_size
+        self.threshold = threshold
+        self.timeout = timeout
+        self.partial = partial or os.path.expanduser('~/.cache/apprepo/partial')
+        self.cache = cache
+        self.session = session or requests.Session()
+        self.progress = progress or ServiceProgress()
+        self.buffer_size = buffer_size
+
+        self.mirrors = mirrors or []
+        self.hedge = hedge
+        self.cooldown = cooldown
+        self._origins = {}
+        self._lock = threading.Lock()
+
+    def _open(self, path):
+        if not len(self.mirrors):
+            return self.session.get(path, stream=True, timeout=self.timeout)
+
+        # Every origin shares the mirror list, scores are kept per origin
+        origin = urlsplit(path)
+        origin = '{}://{}'.format(origin.scheme, origin.netloc)
+        with self._lock:
+            if origin not in self._origins:
+                self._origins[origin] = MirrorSet([origin] + self.mirrors, self.hedge, self.cooldown)
+            mirrors = self._origins[origin]
+
+        return mirrors.call(
+            lambda base: self.session.get(rebase(path, base), stream=True, timeout=self.timeout),
+            lambda response: response.status_code in [200]
+        )
+
+    def _read(self, response, buffer):
+        # One buffer for the whole body, memory stays flat for any file size
+        view = memoryview(buffer)
+        response.raw.decode_content = True
+
+        while True:
+            try:
+                count = response.raw.readinto(buffer)
+            except (urllib3.exceptions.HTTPError, OSError) as ex:
+                raise requests.ConnectionError(ex)
+
+            if not count: return None
+            yield view[:count]
+
+    def _download_stream(self, response, partial):
+
+        filesize = response.headers.get('content-length')
+        if filesize is None or not len(filesize):
+            raise Exception('Content-Length header is empty')
+
+        progress = 0
+        filesize = int(filesize)
+
+        saved = 0
+        name = os.path.basename(response.url)
+        with open(partial.path, 'r+b') as stream, self.progress.task('downloading', name, filesize) as task:
+            try:
+                for chunk in self._read(response, bytearray(self.buffer_size)):
+                    stream.write(chunk)
+                    partial.feed(chunk)
+
+                    progress += len(chunk)
+                    partial.update(0, progress)
+                    task.update(progress)
+
+                    if progress - saved >= self.segment_size:
+                        stream.flush()
+                        partial.save()
+                        saved = progress
+
+                if progress != filesize:
+                    raise requests.ConnectionError('{}: expected {} bytes, got {}'.format(
+                        response.url, filesize, progress
+                    ))
+            finally:
+                # Whatever made it to the disk is not downloaded again
+                stream.flush()
+                partial.save()
+
+        partial.finish(0, progress)
+        return partial.done()
+
+    def _download_file(self, response, partial):
+        progress = 0
+
+        # Without a length there is nothing to preallocate, the body is streamed as it comes
+        name = os.path.basename(response.url)
+        with open(partial.path, 'wb') as destination, self.progress.task('downloading', name) as task:
+            for chunk in self._read(response, bytearray(self.buffer_size)):
+                destination.write(chunk)
+                partial.feed(chunk)
+
+                progress += len(chunk)
+                task.update(progress)
+
+        return partial.done()
+
+    def _download_segment(self, url, partial, segment, descriptor, progress, stop, buffer):
+        start, end = segment
+
+        headers = {'Range': 'bytes={}-{}'.format(start, end - 1)}
+        if partial.validator is not None:
+            headers['If-Range'] = partial.validator
+
+        response = self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+        with response:
+            # A full response means the file changed or ranges are not supported
+            if response.status_code not in [206]:
+                raise SegmentError('{}: expected a partial response, got {}'.format(url, response.status_code))
+
+            position = start
+            for chunk in self._read(response, buffer):
+                if stop.is_set(): break
+                if position + len(chunk) > end:
+                    raise SegmentError('{}: server sent more than requested'.format(url))
+
+                os.pwrite(descriptor, chunk, position)
+                position += len(chunk)
+                partial.update(start, position)
+                progress(len(chunk))
+
+            if stop.is_set():
+                return None
+
+            if position != end:
+                raise requests.ConnectionError('{}: segment {}-{} ended at {}'.format(url, start, end, position))
+
+            partial.finish(start, end)
+            partial.save()
+
+    def _download_worker(self, url, partial, segments, descriptor, progress, failures, stop):
+        buffer = bytearray(min(self.buffer_size, self.segment_size))
+        while not stop.is_set():
+            try:
+                segment, attempt = segments.get_nowait()
+            except queue.Empty:
+                return None
+
+            try:
+                self._download_segment(url, partial, segment, descriptor, progress, stop, buffer)
+            except requests.RequestException as ex:
+                if attempt >= 3:
+                    failures.append(ex)
+                    stop.set()
+                    return None
+
+                # The retry continues where the broken connection stopped
+                start, end = segment
+                position = partial.split(start, end)
+                if position < end:
+                    segments.put(((position, end), attempt + 1))
+            except Exception as ex:
+                failures.append(ex)
+                stop.set()
+                return None
+
+    def _spawn(self, arguments):
+        worker = threading.Thread(target=self._download_worker, args=arguments, daemon=True)
+        worker.start()
+        return worker
+
+    def _download_segmented(self, url, partial, connections=None):
+        logger = logging.getLogger('downloader')
+        connections = connections or self.segments
+        filesize = partial.size
+
+        segments = queue.Queue()
+        for start, end in partial.missing():
+            for position in range(start, end, self.segment_size):
+                segments.put(((position, min(position + self.segment_size, end)), 1))
+
+        lock = threading.Lock()
+        received = [partial.completed]
+
+        def progress(count):
+            with lock:
+                received[0] += count
+                current = received[0]
+            task.update(current)
+
+        failures = []
+        stop = threading.Event()
+
+        workers = []
+        task = self.progress.task('downloading', os.path.basename(url), filesize, received[0])
+        descriptor = os.open(partial.path, os.O_WRONLY)
+        try:
+            arguments = (url, partial, segments, descriptor, progress, failures, stop)
+            for index in range(min(2, connections)):
+                workers.append(self._spawn(arguments))
+
+            started = time.monotonic()
+            sampled, sampled_at, best = received[0], started, 0
+            while any([worker.is_alive() for worker in workers]):
+                deadline = time.monotonic() + 1.0
+                for worker in workers:
+                    worker.join(max(0, deadline - time.monotonic()))
+
+                with lock:
+                    current = received[0]
+                now = time.monotonic()
+                measured = (current - sampled) / max(now - sampled_at, 0.001)
+                sampled, sampled_at = current, now
+
+                task.update(current)
+                partial.digest()
+
+                # Another connection only stays worth it while
+                # it keeps raising the measured throughput
+                if measured > best * 1.1 and len(workers) < connections and not segments.empty():
+                    workers.append(self._spawn(arguments))
+                best = max(best, measured)
+
+            if len(failures):
+                raise failures[0]
+
+            partial.digest()
+
+            logger.info('{}: {} bytes on {} connections in {:.1f}s'.format(
+                url, filesize, len(workers), time.monotonic() - started
+            ))
+
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join(self.timeout)
+
+            # A worker stuck in a read may still write, better leak the descriptor
+            if not any([worker.is_alive() for worker in workers]):
+                os.close(descriptor)
+            partial.save()
+            task.close()
+
+        return partial.done()
+
+    def _download(self, path, partial):
+        logger = logging.getLogger('downloader')
+
+        response = self._open(path)
+        if response is None or response.status_code not in [200]:
+            raise Exception('Can not download file: {}'.format(path))
+
+        total_length = response.headers.get('content-length')
+        accept_ranges = response.headers.get('accept-ranges', '').lower() == 'bytes'
+        validator = response.headers.get('etag') or response.headers.get('last-modified')
+
+        try:
+            if total_length is None or not total_length.isdigit():
+                partial.reset()
+                return self._download_file(response, partial)
+
+            filesize = int(total_length)
+            resumed = partial.load(filesize, validator, accept_ranges)
+            if partial.resumable and (resumed or filesize >= self.threshold):
+                response.close()
+
+                if resumed:
+                    logger.info('{}: resuming at {} of {} bytes'.format(path, partial.completed, filesize))
+
+                try:
+                    connections = self.segments if filesize >= self.threshold else 1
+                    return self._download_segmented(response.url, partial, connections)
+                except SegmentError as ex:
+                    logger.warning('{}, downloading on a single connection'.format(ex))
+                    partial.reset()
+
+                # Stay on the mirror the ranges came from
+                response = self.session.get(response.url, stream=True, timeout=self.timeout)
+                if response is None or response.status_code not in [200]:
+                    raise Exception('Can not download file: {}'.format(path))
+
+            return self._download_stream(response, partial)
+
+        except BaseException:
+            # Nothing can be resumed without range support and a validator
+            if not partial.resumable: partial.discard()
+            raise
+
+    def download(self, path=None, folder=None, hash=None):
+        logger = logging.getLogger('downloader')
+        partial = PartialDownload(path, hash, folder or self.partial)
+
+        if self.cache is not None and hash:
+            download = self.cache.get(hash, partial.path)
+            if download is not None:
+                logger.info('{}: served from the download cache'.format(path))
+                return (download, hash.lower())
+
+        download = self._download(path, partial)
+        digest = partial.hexdigest()
+
+        # A broken file never gets close to the installation
+        if hash is not None and len(hash) and digest != hash.lower():
+            partial.discard()
+            raise Exception('{}: downloaded file does not match the repository hash'.format(path))
+
+        if self.cache is not None and hash:
+            try:
+                self.cache.put(download, digest)
+            except OSError as ex:
+                logger.warning('{}: can not keep the download in the cache: {}'.format(path, ex))
+
+        return (download, digest)
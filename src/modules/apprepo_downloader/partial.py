@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import errno
+import hashlib
+import json
+import logging
+import os
+import threading
+
+
+class PartialDownload(object):
+    def __init__(self, url, hash=None, folder=None):
+        self.url = url
+        self.hash = hash
+
+        # The same file of the same version always lands in the same place
+        key = hashlib.sha1(bytes('{}\0{}'.format(url, hash or ''), 'utf-8')).hexdigest()
+        self.path = os.path.join(folder, '.{}.part'.format(key))
+        self.sidecar = '{}.json'.format(self.path)
+
+        self.size = None
+        self.validator = None
+        self.resumable = False
+
+        self._lock = threading.Lock()
+        self._saving = threading.Lock()
+        self._ranges = []
+        self._active = {}
+
+        self._digest = hashlib.sha1()
+        self._hashed = 0
+
+    def _normalize(self, ranges):
+        result = []
+        for start, end in sorted(ranges):
+            if end <= start: continue
+            if len(result) and start <= result[-1][1]:
+                result[-1][1] = max(result[-1][1], end)
+                continue
+            result.append([start, end])
+        return result
+
+    def load(self, size, validator=None, ranges=True):
+        logger = logging.getLogger('downloader')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self.size = size
+        self.validator = validator
+
+        # Without a validator or a hash a changed file can not be told apart
+        self.resumable = ranges and (validator is not None or self.hash is not None)
+
+        state = None
+        if self.resumable and os.path.exists(self.sidecar) and os.path.exists(self.path):
+            try:
+                with open(self.sidecar, 'r') as stream:
+                    state = json.load(stream)
+            except (ValueError, OSError) as ex:
+                logger.warning('{}: broken partial download state: {}'.format(self.sidecar, ex))
+
+        if state is None or state.get('url') != self.url or state.get('size') != size or \
+                state.get('validator') != validator or state.get('hash') != self.hash:
+            self.reset()
+            return False
+
+        with self._lock:
+            self._ranges = self._normalize(state.get('ranges', []))
+        return len(self._ranges) > 0
+
+    def reset(self):
+        with self._lock:
+            self._ranges = []
+            self._active = {}
+
+        self._digest = hashlib.sha1()
+        self._hashed = 0
+
+        if os.path.exists(self.sidecar):
+            os.unlink(self.sidecar)
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'wb') as stream:
+            if self.size is not None:
+                self._allocate(stream.fileno(), self.size)
+
+    def _allocate(self, descriptor, size):
+        # Reserved up front, a full disk fails the download before the first byte
+        try:
+            os.posix_fallocate(descriptor, 0, size)
+        except OSError as ex:
+            if ex.errno == errno.ENOSPC: raise
+            os.ftruncate(descriptor, size)
+        except AttributeError:
+            os.ftruncate(descriptor, size)
+
+    def update(self, start, position):
+        with self._lock:
+            self._active[start] = position
+
+    def finish(self, start, end):
+        with self._lock:
+            self._active.pop(start, None)
+            self._ranges = self._normalize(self._ranges + [[start, end]])
+
+    def split(self, start, end):
+        with self._lock:
+            position = self._active.pop(start, start)
+            self._ranges = self._normalize(self._ranges + [[start, position]])
+        return position
+
+    @property
+    def ranges(self):
+        with self._lock:
+            return self._normalize(self._ranges + [[start, end] for start, end in self._active.items()])
+
+    @property
+    def completed(self):
+        return sum([end - start for start, end in self.ranges])
+
+    def missing(self):
+        missing = []
+
+        position = 0
+        for start, end in self.ranges:
+            if start > position:
+                missing.append([position, start])
+            position = max(position, end)
+
+        if position < self.size:
+            missing.append([position, self.size])
+        return missing
+
+    def feed(self, data):
+        self._digest.update(data)
+        self._hashed += len(data)
+
+    def digest(self, block_size=1024 * 1024):
+        ranges = self.ranges
+        if not len(ranges) or ranges[0][0] > self._hashed:
+            return None
+
+        # Ranges arrive out of order, the hash follows the
+        # contiguous head while it is still in the page cache
+        descriptor = os.open(self.path, os.O_RDONLY)
+        try:
+            while self._hashed < ranges[0][1]:
+                data = os.pread(descriptor, min(block_size, ranges[0][1] - self._hashed), self._hashed)
+                if not data: break
+                self.feed(data)
+        finally:
+            os.close(descriptor)
+
+        return self._hashed
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def save(self):
+        if not self.resumable:
+            return None
+
+        state = {
+            'url': self.url,
+            'hash': self.hash,
+            'size': self.size,
+            'validator': self.validator,
+            'ranges': self.ranges,
+        }
+
+        with self._saving:
+            temporary = '{}.tmp'.format(self.sidecar)
+            with open(temporary, 'w') as stream:
+                json.dump(state, stream)
+            os.replace(temporary, self.sidecar)
+
+    def discard(self):
+        if os.path.exists(self.sidecar):
+            os.unlink(self.sidecar)
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def done(self):
+        if os.path.exists(self.sidecar):
+            os.unlink(self.sidecar)
+        return self.path
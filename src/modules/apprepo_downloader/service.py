@@ -10,66 +10,40 @@
 # Unless required by applicable law or agreed to in writing, software
 # distributed under the License is distributed on an "AS IS" BASIS,
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
-import sys
-import tempfile
+import os
 
 import hexdi
-import requests
 
-from modules.cmd_application import console
+from .cache import DownloadCache
+from .downloader import ServiceDownloader
 
 
 @hexdi.permanent('downloader')
-class ServiceDownloader(object):
-    def _download_stream(self, response):
-
-        filesize = response.headers.get('content-length')
-        if filesize is None or not len(filesize):
-            raise Exception('Content-Length header is empty')
-
-        progress = 0
-        filesize = int(filesize)
-
-        destination = tempfile.NamedTemporaryFile(delete=False)
-        with open(destination.name, "ab") as stream:
-            for chunk in response.iter_content(chunk_size=8192):
-                if not chunk: break
-                stream.write(chunk)
-
-                progress += len(chunk)
-                done = int(50 * progress / filesize)
-
-                progress_done = '=' * done
-                progress_pending = ' ' * (50 - done)
-                progress_percent = progress / filesize * 100
-
-                sys.stdout.write("\r[{}downloading{}]: [{}{}] {:>.1f} %".format(
-                    console.OKGREEN,
-                    console.ENDC,
-                    progress_done,
-                    progress_pending,
-                    progress_percent
-                ))
-
-                sys.stdout.flush()
-            stream.close()
-
-            sys.stdout.write('\n')
-            sys.stdout.flush()
-
-            return destination.name
-
-    def _download_file(self, response):
-        with tempfile.NamedTemporaryFile(delete=False) as destination:
-            destination.write(response.content)
-            destination.close()
-        return destination.name
-
-    def download(self, path=None):
-        response = requests.get(path, stream=True)
-        if response is None or response.status_code not in [200]:
-            raise Exception('Can not download file: {}'.format(path))
-        total_length = response.headers.get('content-length')
-        if total_length is not None and len(total_length):
-            return self._download_stream(response)
-        return self._download_file(response)
+class ServiceDownloaderInstance(ServiceDownloader):
+    @hexdi.inject('config', 'http', 'progress')
+    def __init__(self, config, http, progress):
+        # Upper bound of parallel connections per download
+        segments = int(config.get('download.segments', 4))
+        segment_size = int(config.get('download.segment_size', 4 * 1024 * 1024))
+        threshold = int(config.get('download.threshold', 16 * 1024 * 1024))
+        timeout = float(config.get('download.timeout', 30))
+        buffer_size = int(config.get('download.buffer_size', 1024 * 1024))
+
+        # Interrupted downloads without a target folder are resumed from here
+        partial = os.path.expanduser(config.get('download.partial', '~/.cache/apprepo/partial'))
+
+        # Size bound of the download cache in MB, 0 disables it
+        cache = os.path.expanduser(config.get('cache.path', '~/.cache/apprepo/downloads'))
+        cache_size = int(config.get('cache.size', 2048)) * 1024 * 1024
+        cache = DownloadCache(cache, cache_size) if cache_size > 0 else None
+
+        # Comma separated hosts serving the same paths as the repository
+        mirrors = config.get('download.mirrors', '').split(',')
+        mirrors = [mirror.strip().rstrip('/') for mirror in mirrors if len(mirror.strip())]
+        hedge = float(config.get('http.hedge', 0.9))
+        cooldown = float(config.get('http.cooldown', 30))
+
+        return super(ServiceDownloaderInstance, self).__init__(
+            segments, segment_size, threshold, timeout, partial, cache, http, progress, buffer_size,
+            mirrors, hedge, cooldown
+        )
@@ -0,0 +1,195 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import collections
+import concurrent.futures
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class Mirror(object):
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.latency = None
+        self.errors = 0.0
+        self.failures = 0
+        self.blocked = 0
+
+    @property
+    def score(self):
+        # Mirrors nobody tried yet go first, so every mirror gets a chance
+        if self.latency is None:
+            return float('inf') if self.errors else 0.0
+        return self.latency * (1.0 + 4.0 * self.errors)
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.blocked
+
+    def __repr__(self):
+        return self.url
+
+
+class MirrorSet(object):
+    def __init__(self, urls, percentile=0.9, cooldown=30, alpha=0.3):
+        self.mirrors = [Mirror(url) for url in urls if url and len(url.strip())]
+        if not len(self.mirrors):
+            raise Exception('at least one mirror is required')
+
+        self.percentile = percentile
+        self.cooldown = cooldown
+        self.alpha = alpha
+
+        self._lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=100)
+
+    def ordered(self):
+        with self._lock:
+            mirrors = sorted(self.mirrors, key=lambda mirror: mirror.score)
+
+        healthy = [mirror for mirror in mirrors if mirror.healthy]
+        # Nothing healthy left, a blocked mirror is better than none
+        return healthy + [mirror for mirror in mirrors if not mirror.healthy]
+
+    def best(self):
+        return self.ordered()[0]
+
+    def record(self, mirror, latency=None, error=False):
+        with self._lock:
+            if error:
+                mirror.errors = mirror.errors * (1 - self.alpha) + self.alpha
+                mirror.failures += 1
+                if mirror.failures >= 3:
+                    mirror.blocked = time.monotonic() + self.cooldown
+                return None
+
+            mirror.errors = mirror.errors * (1 - self.alpha)
+            mirror.failures = 0
+            mirror.blocked = 0
+
+            self._latencies.append(latency)
+            if mirror.latency is None:
+                mirror.latency = latency
+                return None
+            mirror.latency = mirror.latency * (1 - self.alpha) + latency * self.alpha
+
+    def delay(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+
+        # Too few samples to tell a slow answer from a normal one
+        if len(latencies) < 5:
+            return None
+
+        return latencies[min(len(latencies) - 1, int(len(latencies) * self.percentile))]
+
+    def _attempt(self, mirror, request, acceptable):
+        started = time.monotonic()
+        try:
+            response = request(mirror.url)
+        except Exception:
+            self.record(mirror, error=True)
+            raise
+
+        if not acceptable(response):
+            self.record(mirror, error=True)
+            raise MirrorError('{}: unexpected response {}'.format(mirror.url, response.status_code), response)
+
+        self.record(mirror, time.monotonic() - started)
+        return response
+
+    def _submit(self, mirror, request, acceptable):
+        future = concurrent.futures.Future()
+
+        def attempt():
+            if not future.set_running_or_notify_cancel(): return None
+            try:
+                future.set_result(self._attempt(mirror, request, acceptable))
+            except Exception as ex:
+                future.set_exception(ex)
+
+        # A daemon thread per attempt, an abandoned duplicate
+        # never keeps the interpreter waiting for its timeout
+        threading.Thread(target=attempt, name='mirror {}'.format(mirror), daemon=True).start()
+        return future
+
+    def call(self, request, acceptable=None):
+        logger = logging.getLogger('mirrors')
+        acceptable = acceptable or (lambda response: response.status_code < 500)
+
+        pending = collections.deque(self.ordered())
+        running = {}
+        error = None
+
+        # Nothing to hedge or fail over to, the caller's thread does the request
+        if len(pending) == 1:
+            try:
+                return self._attempt(pending.popleft(), request, acceptable)
+            except MirrorError as ex:
+                logger.warning(ex)
+                return ex.response
+
+        def submit():
+            mirror = pending.popleft()
+            running[self._submit(mirror, request, acceptable)] = mirror
+
+        submit()
+        while len(running):
+            # A duplicate goes to the next mirror once the first one is slower than usual
+            timeout = self.delay() if len(running) == 1 and len(pending) else None
+            done, waiting = concurrent.futures.wait(
+                list(running.keys()), timeout, concurrent.futures.FIRST_COMPLETED
+            )
+
+            if not len(done):
+                logger.debug('{}: slower than {:.0f} ms, hedging'.format(running[waiting.pop()], timeout * 1000))
+                submit()
+                continue
+
+            for future in done:
+                mirror = running.pop(future)
+                try:
+                    response = future.result()
+                except Exception as ex:
+                    logger.warning('{}: {}'.format(mirror, ex))
+                    error = ex
+                    if len(pending) and not len(running): submit()
+                    continue
+
+                # The slower duplicate is dropped as soon as it answers
+                for other in running.keys():
+                    other.add_done_callback(self._discard)
+                return response
+
+        if isinstance(error, MirrorError):
+            return error.response
+        raise error
+
+    def _discard(self, future):
+        try:
+            future.result().close()
+        except Exception:
+            pass
+
+
+class MirrorError(Exception):
+    def __init__(self, message, response=None):
+        super(MirrorError, self).__init__(message)
+        self.response = response
+
+
+def rebase(url, base):
+    origin = urlsplit(url)
+    return '{}{}{}'.format(
+        base.rstrip('/'), origin.path, '?{}'.format(origin.query) if origin.query else ''
+    )
@@ -0,0 +1,27 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import hexdi
+
+from .session import HttpSession
+
+
+@hexdi.permanent('http')
+class ServiceHttpInstance(HttpSession):
+    @hexdi.inject('config')
+    def __init__(self, config):
+        # Connections kept alive per host, parallel downloads need one each
+        pool_size = int(config.get('http.pool_size', 10))
+        retries = int(config.get('http.retries', 3))
+        backoff = float(config.get('http.backoff', 0.5))
+        timeout = float(config.get('http.timeout', 30))
+
+        return super(ServiceHttpInstance, self).__init__(pool_size, retries, backoff, timeout)
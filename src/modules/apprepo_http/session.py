@@ -0,0 +1,36 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class HttpSession(requests.Session):
+    def __init__(self, pool_size=10, retries=3, backoff=0.5, timeout=30):
+        super(HttpSession, self).__init__()
+        self.timeout = timeout
+
+        # Only idempotent requests are retried, uploads
+        # decide themselves whether a chunk can be sent again
+        retry = Retry(
+            total=retries, connect=retries, read=retries, backoff_factor=backoff,
+            status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False
+        )
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout', None) is None:
+            kwargs['timeout'] = self.timeout
+        return super(HttpSession, self).request(method, url, **kwargs)
@@ -0,0 +1,164 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import sys
+import threading
+import time
+
+from modules.cmd_application import console
+
+
+class ProgressTask(object):
+    def __init__(self, progress, label, name=None, total=None, done=0):
+        self.progress = progress
+        self.label = label
+        self.name = name
+        self.total = total
+
+        # Resumed transfers do not count the old bytes into the throughput
+        self.initial = done
+        self.done = done
+        self.started = time.monotonic()
+        self.finished = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def advance(self, count):
+        self.update(self.done + count)
+
+    def update(self, done):
+        self.done = done
+        self.progress.render()
+
+    def close(self):
+        if self.finished is not None:
+            return None
+
+        self.finished = time.monotonic()
+        self.progress.finish(self)
+
+    @property
+    def throughput(self):
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return (self.done - self.initial) / max(elapsed, 0.001)
+
+    @property
+    def eta(self):
+        if not self.total or not self.throughput:
+            return None
+        return max(self.total - self.done, 0) / self.throughput
+
+    def _size(self, value):
+        for unit in ['B', 'KB', 'MB', 'GB']:
+            if value < 1024 or unit == 'GB':
+                return '{:.1f} {}'.format(value, unit)
+            value /= 1024
+
+    def _time(self, value):
+        value = int(value)
+        return '{:02d}:{:02d}'.format(value // 60, value % 60)
+
+    def format(self, bar=True):
+        details = ['{}/s'.format(self._size(self.throughput))]
+
+        if self.total:
+            percent = min(self.done / self.total, 1.0)
+            details.insert(0, '{:>5.1f} %'.format(percent * 100))
+
+            if self.finished is not None:
+                details.append(self._time(self.finished - self.started))
+            elif self.eta is not None:
+                details.append('ETA {}'.format(self._time(self.eta)))
+
+            if bar:
+                done = int(50 * percent)
+                details.insert(0, '[{}{}]'.format('=' * done, ' ' * (50 - done)))
+        else:
+            details.insert(0, self._size(self.done))
+
+        if self.name is not None:
+            details.append(self.name)
+
+        return '[{}{}{}]: {}'.format(console.OKGREEN, self.label, console.ENDC, ' '.join(details))
+
+
+class ServiceProgress(object):
+    def __init__(self, stream=None, interval=0.1, mode='auto', line_interval=5):
+        self.stream = stream or sys.stdout
+        self.interval = interval
+        self.line_interval = line_interval
+
+        self.mode = mode
+        if self.mode == 'auto':
+            isatty = getattr(self.stream, 'isatty', None)
+            self.mode = 'bar' if isatty is not None and isatty() else 'line'
+
+        self._lock = threading.RLock()
+        self._tasks = []
+        self._lines = 0
+        self._rendered = 0
+
+    def task(self, label, name=None, total=None, done=0):
+        task = ProgressTask(self, label, name, total, done)
+        with self._lock:
+            self._tasks.append(task)
+        self.render(True)
+        return task
+
+    def _draw(self, tasks):
+        # Back to the first line of the block, every line is drawn again
+        output = '\x1b[{}A\r'.format(self._lines) if self._lines else '\r'
+        for task in tasks:
+            output += '{}\x1b[K\n'.format(task.format())
+        return output
+
+    def render(self, force=False):
+        if self.mode == 'quiet':
+            return None
+
+        now = time.monotonic()
+        interval = self.interval if self.mode == 'bar' else self.line_interval
+        if not force and now - self._rendered < interval:
+            return None
+
+        # Several threads report progress, one of them draws
+        if not self._lock.acquire(blocking=force):
+            return None
+
+        try:
+            self._rendered = now
+            if self.mode == 'bar':
+                self.stream.write(self._draw(self._tasks))
+                self._lines = len(self._tasks)
+            elif not force:
+                for task in self._tasks:
+                    self.stream.write('{}\n'.format(task.format(False)))
+            self.stream.flush()
+        finally:
+            self._lock.release()
+
+    def finish(self, task):
+        with self._lock:
+            if task not in self._tasks:
+                return None
+
+            # The finished task is drawn first and stays above the others
+            self._tasks.remove(task)
+            if self.mode == 'bar':
+                self.stream.write(self._draw([task] + self._tasks))
+                self._lines = len(self._tasks)
+            elif self.mode == 'line':
+                self.stream.write('{}\n'.format(task.format(False)))
+            self.stream.flush()
@@ -0,0 +1,27 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import hexdi
+
+from .progress import ServiceProgress
+
+
+@hexdi.permanent('progress')
+class ServiceProgressInstance(ServiceProgress):
+    @hexdi.inject('config')
+    def __init__(self, config):
+        # auto draws bars on a terminal and plain lines
+        # otherwise, bar, line and quiet force one of them
+        mode = config.get('progress.mode', 'auto')
+        interval = float(config.get('progress.interval', 0.1))
+        line_interval = float(config.get('progress.line_interval', 5))
+
+        return super(ServiceProgressInstance, self).__init__(None, interval, mode, line_interval)
@@ -0,0 +1,41 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import time
+
+import hexdi
+
+console = hexdi.resolve('console')
+if not console: raise Exception('Console service not found')
+description = "<refresh|status>\tdownload the repository catalog for local and offline searches"
+
+
+@console.task(name=['catalog'], description=description)
+@hexdi.inject('apprepo')
+def main(options=None, args=None, apprepo=None):
+    action = ' '.join(args).strip('\'" ') or 'status'
+    if action not in ['refresh', 'status']:
+        raise Exception('{}: unknown action, refresh or status expected'.format(action))
+
+    if action == 'refresh':
+        changed, count = apprepo.refresh()
+        yield console.green("[{}]: {} packages".format('updated' if changed else 'unchanged', count))
+
+    state = apprepo.catalog.state()
+    if not apprepo.catalog.available:
+        yield console.comment("[catalog]: not downloaded yet or disabled")
+        return 0
+
+    yield console.comment("[catalog]: {} packages, refreshed {:.0f} seconds ago{}".format(
+        state.get('count', 0), time.time() - state.get('fetched', 0),
+        '' if apprepo.catalog.fresh else ', outdated'
+    ))
+    return 0
@@ -9,27 +9,26 @@
 # Unless required by applicable law or agreed to in writing, software
 # distributed under the License is distributed on an "AS IS" BASIS,
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
-import configparser
 import glob
 import os
 import pathlib
 
 import hexdi
 
+from modules.apprepo_appimage.apprepo.desktop import DesktopEntry
+
 console = hexdi.resolve('console')
 if not console: raise Exception('Console service not found')
 description = "Remove abandoned .desktop files and icons"
 
 
 @console.task(name=['cleanup', 'clear'], description=description)
-def main(options=None, args=None):
+@hexdi.inject('appimagetool')
+def main(options=None, args=None, appimagetool=None):
     integration = '/usr/share' if options.systemwide else \
         os.path.expanduser('~/.local/share')
 
-    config = configparser.RawConfigParser()
-    config.optionxform = str
-
-    existed = []
+    existed = set()
     for desktop in glob.glob('{}/applications/*.desktop'.format(integration)):
         if os.path.isdir(desktop):
             continue
@@ -39,9 +38,11 @@ def main(options=None, args=None):
         desktop_name = pathlib.Path(desktop)
         desktop_name = desktop_name.stem
 
-        config.read(desktop)
+        config = DesktopEntry.load(desktop)
 
         property_exec = config.get('Desktop Entry', 'Exec')
+        if not property_exec: continue
+
         property_exec = property_exec.split(' ')
         property_exec = property_exec.pop(0)
 
@@ -59,7 +60,7 @@ def main(options=None, args=None):
             os.remove(desktop)
             continue
 
-        existed.append(config.get('Desktop Entry', 'Icon'))
+        existed.add(config.get('Desktop Entry', 'Icon'))
         continue
 
     for icon in glob.glob('{}/icons/*'.format(integration)):
@@ -78,4 +79,8 @@ def main(options=None, args=None):
         os.remove(icon)
         continue
 
+    if appimagetool.storage is not None:
+        for chunk in appimagetool.storage.collect():
+            yield console.warning("[removing]: {}, chunk is not used...".format(os.path.basename(chunk)))
+
     return 0
@@ -21,10 +21,15 @@ description = "<string>\tinstall the application and integrate it into the syste
 @console.task(name=['install', 'get', 'in'], description=description)
 @hexdi.inject('appimagetool', 'apprepo', 'downloader', 'console')
 def main(options=None, args=None, appimagetool=None, apprepo=None, downloader=None, console=None):
-    string = ' '.join(args).strip('\'" ')
-    if not string: raise Exception('search string can not be empty')
+    names = [name.strip('\'" ') for name in args if len(name.strip('\'" '))]
+    if not len(names): raise Exception('search string can not be empty')
 
-    for entity in apprepo.package(string):
+    # All package data in one parallel round, nothing is installed if a name is unknown
+    entities = apprepo.packages(names)
+    for name, entity in zip(names, entities):
+        if entity is None: raise Exception('Can not fetch package data: {}'.format(name))
+
+    for entity in entities:
 
         package = entity.get('package', None)
         if not package: raise Exception('Package is empty')
@@ -35,13 +40,15 @@ def main(options=None, args=None, appimagetool=None, apprepo=None, downloader=No
         download_file = entity.get('file', None)
         if not download_file: raise Exception('File is empty')
 
-        download = downloader.download(download_file)
+        # Download next to the destination, so the install is a rename
+        destination = appimagetool.get_path_appimage(package, options.systemwide)
+        download, digest = downloader.download(download_file, os.path.dirname(destination), entity.get('hash', None))
         if not download: yield 'Can not download: {}'.format(download_file)
 
         assert (os.path.exists(download))
 
         appimage, desktop, icon, alias = appimagetool.install(
-            download, package, options.force, options.systemwide
+            download, package, options.force, options.systemwide, digest
         )
 
         if not desktop: raise Exception('Desktop file is empty')
@@ -0,0 +1,42 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import os
+import pathlib
+
+import hexdi
+
+console = hexdi.resolve('console')
+if not console: raise Exception('Console service not found')
+description = "<string>\tswitch the application back to the previously installed version"
+
+
+@console.task(name=['rollback', 'downgrade'], description=description)
+@hexdi.inject('appimagetool', 'console.application')
+def main(options=None, args=None, appimagetool=None, console=None):
+    search = ' '.join(args).strip('\'" ')
+    if not search: raise Exception('package name can not be empty')
+
+    for package in appimagetool.versioned(options.systemwide):
+        if package != search and pathlib.Path(package).stem.lower() != search.lower():
+            continue
+
+        appimage, desktop, icon, alias = appimagetool.rollback(package, options.systemwide)
+
+        yield console.green("[done]: {}, {}, {}, {}".format(
+            os.path.basename(appimage) if os.path.exists(appimage) else "---",
+            os.path.basename(desktop) if desktop and os.path.exists(desktop) else "---",
+            os.path.basename(icon) if icon and os.path.exists(icon) else "---",
+            os.path.basename(alias) if alias and os.path.exists(alias) else "---",
+        ))
+        return 0
+
+    raise Exception('{}: no previous version found'.format(search))
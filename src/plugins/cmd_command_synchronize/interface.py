@@ -29,24 +29,38 @@ def main(options=None, args=None, appimagetool=None, console=None):
             stream.write('PATH=~/.local/bin:$PATH')
             stream.close()
 
-    for appimage, desktop, icon, alias in appimagetool.collection():
-
-        if not os.path.exists(desktop) or not glob.glob(icon) or not os.path.exists(alias):
-            desktop, icon, alias = appimagetool.integrate(appimage, options.systemwide)
+    pending = []
+    for entry in appimagetool.collection():
+        appimage, desktop, icon, alias = entry
+        if not appimagetool.is_integrated(appimage, options.systemwide, entry.status):
+            pending.append(appimage)
+            continue
 
         yield console.green("[done]: {}, {}, {}, {}".format(
-            os.path.basename(appimage)
-            if appimage is not None and os.path.exists(appimage)
-            else '---',
-            os.path.basename(desktop) if
-            desktop is not None and os.path.exists(desktop)
-            else '---',
-            os.path.basename(icon) if
-            icon is not None and glob.glob(icon)
-            else '---',
-            os.path.basename(alias) if
-            alias is not None and os.path.exists(alias)
-            else '---'
+            os.path.basename(appimage),
+            os.path.basename(desktop),
+            os.path.basename(icon),
+            os.path.basename(alias)
         ))
 
+    for appimage, desktop, icon, alias in appimagetool.integrate_many(pending, options.systemwide):
+        yield _status(console, appimage, desktop, icon, alias)
+
     return 0
+
+
+def _status(console, appimage, desktop, icon, alias):
+    return console.green("[done]: {}, {}, {}, {}".format(
+        os.path.basename(appimage)
+        if appimage is not None and os.path.exists(appimage)
+        else '---',
+        os.path.basename(desktop) if
+        desktop is not None and os.path.exists(desktop)
+        else '---',
+        os.path.basename(icon) if
+        icon is not None and glob.glob(icon)
+        else '---',
+        os.path.basename(alias) if
+        alias is not None and os.path.exists(alias)
+        else '---'
+    ))
@@ -25,26 +25,26 @@ description = "Test compatibility of the selected package with the current host"
 
 
 @console.task(name=['test', 'check', 'validate'], description=description)
-def test_search_request(options=None, args=None):
-    if args is None or not len(args):
-        args = [None]
+@hexdi.inject('apprepo')
+def test_search_request(options=None, args=None, apprepo=None):
+    names = [package.strip('\'"') for package in args or [] if len(package.strip('\'"'))]
+    if not len(names):
+        yield console.comment("[processing]: search request {}...".format(None))
+        for output in _test_search_request_element(apprepo.search(''), options):
+            yield output
+        return 0
 
-    for package in args:
-        package = package.strip('\'"') if package else None
-        for output in _test_search_request_element(package, options):
+    # Package data for every name in one parallel round, the tests run one by one
+    for search, entity in zip(names, apprepo.packages(names)):
+        yield console.comment("[processing]: search request {}...".format(search))
+        for output in _test_search_request_element([entity] if entity is not None else [], options):
             yield output
 
     return 0
 
 
-@hexdi.inject('apprepo', 'downloader', 'console')
-def _test_search_request_element(search=None, options=None, apprepo=None, downloader=None, console=None):
-    yield console.comment("[processing]: search request {}...".format(search))
-
-    collection = apprepo.search('') \
-        if not search else \
-        apprepo.package(search)
-
+@hexdi.inject('downloader', 'console')
+def _test_search_request_element(collection=None, options=None, downloader=None, console=None):
     for index, entity in enumerate(collection, start=1):
 
         try:
@@ -56,7 +56,7 @@ def _test_search_request_element(search=None, options=None, apprepo=None, downlo
             if not download_file: raise Exception('File is empty')
             yield console.comment("[processing]: file {}...".format(download_file))
 
-            download = downloader.download(download_file)
+            download, digest = downloader.download(download_file, None, entity.get('hash', None))
             if not download: yield 'Can not download: {}'.format(download_file)
 
             assert (os.path.exists(download))
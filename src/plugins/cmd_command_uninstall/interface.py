@@ -43,13 +43,7 @@ def main(options=None, args=None, appimagetool=None, console=None):
         for path in glob.glob(str(appimage)):
             os.remove(path)
 
-        for path in glob.glob(str(desktop)):
-            os.remove(path)
-
-        for path in glob.glob(str(alias)):
-            os.remove(path)
-
-        for path in glob.glob(str(icon)):
-            os.remove(path)
+        # Integrated for the location it was found in, not for the command line flag
+        appimagetool.unintegrate(str(appimage), appimagetool.is_systemwide(str(appimage)))
 
     return 0
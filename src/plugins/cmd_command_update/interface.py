@@ -14,10 +14,11 @@ import os
 import hexdi
 
 
-@hexdi.inject('appimagetool', 'apprepo', 'console.application', 'apprepo.hasher')
-def _update_action(search=None, options=None, appimagetool=None, apprepo=None, application=None, hasher=None):
+@hexdi.inject('appimagetool', 'apprepo', 'console.application', 'apprepo.hasher', 'delta')
+def _update_action(results=None, options=None, appimagetool=None, apprepo=None, application=None, hasher=None,
+                   delta=None):
     version_remote = {}
-    for result in apprepo.search('' if not search else search):
+    for result in results:
         package = result.get('package', None)
         if not package: continue
 
@@ -26,7 +27,8 @@ def _update_action(search=None, options=None, appimagetool=None, apprepo=None, a
 
         version_remote[package] = hash
 
-    for appimage, desktop, icon, alias in appimagetool.collection(version_remote.keys()):
+    for entry in appimagetool.collection(version_remote.keys()):
+        appimage = entry.appimage
         yield console.comment('[checking]: {}...'.format(os.path.basename(appimage)))
 
         try:
@@ -38,16 +40,42 @@ def _update_action(search=None, options=None, appimagetool=None, apprepo=None, a
                 yield console.warning('[ignoring]: {}, unknown package'.format(package))
                 continue
 
+            # The ELF header is a single read, no need to hash broken files
+            try:
+                if entry.metadata.type is None: raise ValueError('unknown AppImage type')
+            except (ValueError, OSError) as ex:
+                yield console.warning('[ignoring]: {}, not an AppImage: {}'.format(package, ex))
+                continue
+
             hash_remote = version_remote[package]
             if not hash_remote: raise ValueError('{}: empty remote hash'.format(package))
 
-            hash_local = hasher(appimage)
-            if not hash_remote: raise ValueError('{}: empty local hash'.format(package))
+            # Recorded at install time, read again only if the file changed since
+            hash_local = appimagetool.hash(appimage, entry.status, hasher)
+            if not hash_local: raise ValueError('{}: empty local hash'.format(package))
 
             if hash_remote == hash_local:
                 yield '[{}]: {}, up to date'.format(console.warning('ignoring'), package)
                 continue
 
+            update_information = entry.metadata.update_information
+            if update_information is not None:
+                try:
+                    destination = appimagetool.get_path_appimage(package, options.systemwide)
+                    download, reused, fetched = delta.update(
+                        appimage, update_information, hash_remote, os.path.dirname(destination)
+                    )
+                except Exception as ex:
+                    yield console.warning('[delta]: {}, {}, downloading the whole file'.format(package, ex))
+                    download = None
+
+                if download is not None:
+                    appimagetool.install(download, package, True, options.systemwide, hash_remote)
+                    yield console.green('[done]: {}, reused {:.1f} MB, downloaded {:.1f} MB'.format(
+                        package, reused / 1024 / 1024, fetched / 1024 / 1024
+                    ))
+                    continue
+
             command = application.get_command('install')
             for entity in command(options, [package]):
                 yield entity
@@ -62,12 +90,16 @@ description = "Compare the installed applications and the application in the rep
 
 
 @console.task(name=['update', 'upgrade', 'up'], description=description)
-def update_action(options=None, args=None):
-    if args is None or not len(args):
-        args = [None]
+@hexdi.inject('apprepo')
+def update_action(options=None, args=None, apprepo=None):
+    names = [package.strip('\'"') for package in args or [] if len(package.strip('\'"'))]
+    if not len(names):
+        for output in _update_action(apprepo.search(''), options):
+            yield output
+        return 0
 
-    for package in args:
-        package = package.strip('\'"') if package else None
-        for output in _update_action(package, options):
+    # The arguments are search strings, not exact package names
+    for name in names:
+        for output in _update_action(apprepo.search(name), options):
             yield output
     return 0
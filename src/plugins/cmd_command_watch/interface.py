@@ -0,0 +1,39 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import os
+
+import hexdi
+
+console = hexdi.resolve('console')
+if not console: raise Exception('Console service not found')
+description = "watch the AppImage folders and integrate or remove the applications as soon as they change"
+
+
+@console.task(name=['watch', 'daemon'], description=description)
+@hexdi.inject('appimagetool', 'console.application')
+def main(options=None, args=None, appimagetool=None, console=None):
+    yield console.comment("[watching]: {}...".format(', '.join(appimagetool.locations)))
+
+    for action, appimage, desktop, icon, alias in appimagetool.watch():
+        if action == 'failed':
+            yield console.error("[failed]: {}".format(os.path.basename(appimage)))
+            continue
+
+        yield console.green("[{}]: {}, {}, {}, {}".format(
+            'done' if action == 'integrate' else 'removed',
+            os.path.basename(appimage),
+            os.path.basename(desktop) if desktop is not None else '---',
+            os.path.basename(icon) if icon is not None else '---',
+            os.path.basename(alias) if alias is not None else '---',
+        ))
+
+    return 0
@@ -0,0 +1,114 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import email.parser
+import email.policy
+import hashlib
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class ChunkedUploadHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, data, status=200):
+        body = bytes(json.dumps(data), 'utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path == '/package/upload/initialize/':
+            return self._initialize(body)
+        if self.path == '/package/upload/complete/finalize/':
+            return self._finalize(body)
+        return self._json({'detail': 'not found'}, 404)
+
+    def _initialize(self, body):
+        server = self.server
+        # The body alone is no message, the boundary comes from the request headers
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            bytes('Content-Type: {}\r\n\r\n'.format(self.headers['Content-Type']), 'latin-1') + body
+        )
+        form = {part.get_param('name', header='content-disposition'): part.get_payload(decode=True)
+                for part in message.iter_parts()}
+
+        match = re.match(r'^bytes (\d+)-(-?\d+)/(\d+)$', self.headers.get('Content-Range', ''))
+        if match is None: return self._json({'detail': 'Error in request headers'}, 400)
+
+        with server.lock:
+            unique = str(form.get('upload_id') or b'', 'utf-8') or None
+            if unique is None:
+                unique = 'upload{}'.format(len(server.uploads))
+                server.uploads[unique] = bytearray()
+            if unique not in server.uploads:
+                return self._json({'detail': 'Upload not found'}, 404)
+
+            # Like django-chunked-upload, a chunk is only taken at the current end of the file
+            data = server.uploads[unique]
+            if int(match.group(1)) != len(data):
+                return self._json({'detail': 'Offsets do not match', 'offset': len(data)}, 400)
+
+            data.extend(form['file'])
+            server.chunks.append(int(match.group(1)))
+
+            # The chunk is kept, but its answer never arrives
+            if int(match.group(1)) in server.drop:
+                server.drop.remove(int(match.group(1)))
+                self.close_connection = True
+                return None
+
+        return self._json({'upload_id': unique, 'offset': len(data)})
+
+    def _finalize(self, body):
+        server = self.server
+        fields = {key: value[0] for key, value in parse_qs(str(body, 'utf-8')).items()}
+
+        with server.lock:
+            data = bytes(server.uploads.get(fields.get('upload_id'), b''))
+
+        if hashlib.md5(data).hexdigest() != fields.get('md5') or hashlib.sha1(data).hexdigest() != fields.get('sha1'):
+            return self._json({'detail': 'checksum mismatch'}, 400)
+
+        server.files[fields.get('file')] = data
+        return self._json({'success': True, 'package': {'file': fields.get('file'), 'size': len(data)}})
+
+
+class ChunkedUploadServer(ThreadingHTTPServer):
+    def __init__(self, address=('127.0.0.1', 0)):
+        super(ChunkedUploadServer, self).__init__(address, ChunkedUploadHandler)
+        self.lock = threading.Lock()
+        self.uploads = {}
+        self.chunks = []
+        self.files = {}
+        self.drop = set()
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(*self.server_address)
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,64 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import os
+import tempfile
+import unittest
+
+from modules.apprepo_appimage.apprepo import utils
+
+
+class CopyFileObjTestCase(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.data = os.urandom(3 * utils.BUFFER_SIZE + 123)
+        self.source = os.path.join(self.folder.name, 'source')
+        with open(self.source, 'wb') as stream:
+            stream.write(self.data)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def copy(self, offset, prefix=b''):
+        destination = os.path.join(self.folder.name, 'destination')
+        with open(self.source, 'rb') as stream_source, open(destination, 'wb') as stream_destination:
+            stream_source.read(offset)
+            stream_destination.write(prefix)
+            utils.copyfileobj(stream_source, stream_destination)
+            self.assertEqual(stream_source.tell(), len(self.data))
+            self.assertEqual(stream_destination.tell(), len(prefix) + len(self.data) - offset)
+
+        with open(destination, 'rb') as stream:
+            return stream.read()
+
+    def test_whole_file(self):
+        self.assertEqual(self.copy(0), self.data)
+
+    def test_source_position(self):
+        self.assertEqual(self.copy(1000), self.data[1000:])
+
+    def test_destination_position(self):
+        self.assertEqual(self.copy(7, b'header'), b'header' + self.data[7:])
+
+    def test_every_method(self):
+        methods = [utils._copy_file_range, utils._copy_sendfile, utils._copy_buffered]
+        for method in methods:
+            with open(self.source, 'rb') as stream_source, tempfile.TemporaryFile() as stream_destination:
+                stream_destination.write(b'xy')
+                stream_destination.flush()
+                copied = method(stream_source.fileno(), stream_destination.fileno(), 5, 2, len(self.data) - 5, 0)
+                self.assertEqual(copied, len(self.data) - 5, method.__name__)
+                stream_destination.seek(0)
+                self.assertEqual(stream_destination.read(), b'xy' + self.data[5:], method.__name__)
+
+
+if __name__ == '__main__':
+    unittest.main()
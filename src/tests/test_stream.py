@@ -0,0 +1,38 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import json
+import unittest
+
+from modules.apprepo_api.stream import JsonArrayStream
+
+
+class JsonArrayStreamTestCase(unittest.TestCase):
+    def split(self, text, size):
+        data = text.encode('utf-8')
+        return [data[offset:offset + size] for offset in range(0, len(data), size)]
+
+    def test_every_chunk_boundary(self):
+        text = '[4.5, -12, 1e5 , 0.25e-3,{"name": "ä", "size": 1024}, null, "x", 100]'
+        for size in range(1, len(text.encode('utf-8')) + 1):
+            self.assertEqual(list(JsonArrayStream(self.split(text, size))), json.loads(text), size)
+
+    def test_single_value(self):
+        for size in [1, 2, 100]:
+            self.assertEqual(list(JsonArrayStream(self.split('12345', size))), [12345])
+
+    def test_truncated_array(self):
+        with self.assertRaises(ValueError):
+            list(JsonArrayStream(self.split('[4.5, 1', 1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# Copyright 2020 Alex Woroschilow (alex.woroschilow@gmail.com)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import os
+import tempfile
+import unittest
+
+import requests
+
+from modules.apprepo_api.rest import ServiceApprepo
+from modules.apprepo_progress.progress import ServiceProgress
+from .server import ChunkedUploadServer
+
+
+class UploadTestCase(unittest.TestCase):
+    def setUp(self):
+        descriptor, self.path = tempfile.mkstemp(suffix='.AppImage')
+        with os.fdopen(descriptor, 'wb') as stream:
+            stream.write(os.urandom(300 * 1024 + 123))
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def _upload(self, server):
+        apprepo = ServiceApprepo(server.url, requests.Session(), ServiceProgress(mode='quiet'),
+                                 retries=2, chunk_size=64 * 1024)
+        return apprepo.upload(self.path, 'authentication', 'token', 'name', 'description')
+
+    def test_upload(self):
+        with ChunkedUploadServer() as server:
+            package = self._upload(server)
+
+            with open(self.path, 'rb') as stream:
+                self.assertEqual(server.files[os.path.basename(self.path)], stream.read())
+
+        self.assertEqual(package.get('size'), os.path.getsize(self.path))
+        self.assertEqual(server.chunks, sorted(server.chunks))
+        self.assertEqual(len(server.chunks), 5)
+
+    def test_upload_lost_answer(self):
+        with ChunkedUploadServer() as server:
+            server.drop = {64 * 1024}
+            package = self._upload(server)
+
+        self.assertEqual(package.get('size'), os.path.getsize(self.path))
+        self.assertEqual(len(server.uploads), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()